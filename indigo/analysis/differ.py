@@ -10,7 +10,7 @@ import lxml.html.builder
 from lxml import etree
 from xmldiff import main as xmldiff_main, formatting
 
-from indigo.xmlutils import unwrap_element
+from indigo.xmlutils import unwrap_element, load_xslt
 
 log = logging.getLogger(__name__)
 
@@ -21,9 +21,7 @@ class HTMLFormatter(formatting.XMLFormatter):
     xslt_filename = os.path.join(os.path.dirname(__file__), 'xmldiff.xslt')
 
     def render(self, result):
-        with open(self.xslt_filename) as f:
-            xslt = lxml.etree.fromstring(f.read())
-            transform = lxml.etree.XSLT(xslt)
+        transform = load_xslt(self.xslt_filename)
         result = transform(result)
 
         # XSLT doesn't let us add an element to an attribute, so here
@@ -132,6 +130,11 @@ class AKNHTMLDiffer:
 class AttributeDiffer:
     html_differ_class = AKNHTMLDiffer
 
+    version = 1
+    """ The version of the document diffs produced by this differ. Increase this when changing how documents are
+    diffed, so that diffs cached by earlier versions aren't used.
+    """
+
     def attr_title(self, attr):
         return attr.title().replace('_', ' ')
 
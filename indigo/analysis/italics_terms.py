@@ -1,3 +1,4 @@
+from functools import lru_cache
 from lxml import etree
 import re
 
@@ -5,6 +6,40 @@ from indigo.analysis.markup import TextPatternMarker
 from indigo.plugins import LocaleBasedMatcher, plugins
 
 
+class ItalicsMatcher:
+    """ Compiled patterns for finding a list of italics terms in text.
+    """
+    def __init__(self, terms):
+        # candidate text must contain at least one of these
+        partials = set(partial for t in terms for partial in t.split('"'))
+        if '' in partials:
+            # every text contains the empty string
+            self.prefilter = lambda text: True
+        else:
+            self.prefilter = re.compile('|'.join(re.escape(p) for p in sorted(partials))).search
+
+        # first, sort longest to shortest, so that e.g. 'ad idem' is marked up before 'ad'
+        terms = sorted(terms, key=len, reverse=True)
+        terms = [t.strip() for t in terms]
+        terms = [re.escape(t) for t in terms if t]
+        terms = '|'.join(terms)
+        terms = fr'\b({terms})\b'
+
+        self.pattern_re = re.compile(terms)
+
+    @classmethod
+    def for_terms(cls, terms):
+        """ Get a (cached) matcher for these terms. Because the matcher is cached by the terms themselves,
+        changing a country's italics terms uses a new matcher.
+        """
+        return _cached_italics_matcher(tuple(terms))
+
+
+@lru_cache(maxsize=32)
+def _cached_italics_matcher(terms):
+    return ItalicsMatcher(terms)
+
+
 @plugins.register('italics-terms')
 class BaseItalicsFinder(LocaleBasedMatcher, TextPatternMarker):
     """ Italicises terms in a document.
@@ -17,25 +52,24 @@ class BaseItalicsFinder(LocaleBasedMatcher, TextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
-        self.setup_candidate_xpath(italics_terms)
-        self.setup_pattern_re(italics_terms)
-        self.setup(root)
-        self.markup_patterns(root)
+        self.mark_up_italics_in_tree(root, italics_terms)
         document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
-    def setup_candidate_xpath(self, terms):
-        xpath_contains = ' or '.join([f'contains(., "{term}")' for term in [partial for t in terms for partial in t.split('"')]])
-        self.candidate_xpath = f'.//text()[({xpath_contains}) and not(ancestor::a:i)]'
+    def mark_up_italics_in_tree(self, root, italics_terms, elements=None):
+        """ Find and italicise terms in +root+, a parsed XML document, changing the tree in place.
 
-    def setup_pattern_re(self, terms):
-        # first, sort longest to shortest, so that e.g. 'ad idem' is marked up before 'ad'
-        terms = sorted(terms, key=len, reverse=True)
-        terms = [t.strip() for t in terms]
-        terms = [re.escape(t) for t in terms if t]
-        terms = '|'.join(terms)
-        terms = fr'\b({terms})\b'
+        If +elements+ is given, only those elements of the tree are marked up.
+        """
+        self.elements = elements
+        self.matcher = ItalicsMatcher.for_terms(italics_terms)
+        self.candidate_xpath = './/text()[not(ancestor::a:i)]'
+        self.pattern_re = self.matcher.pattern_re
+        self.setup(root)
+        self.markup_patterns(root)
 
-        self.pattern_re = re.compile(terms)
+    def candidate_nodes(self, root):
+        prefilter = self.matcher.prefilter
+        return [text for text in super().candidate_nodes(root) if prefilter(text)]
 
     def markup_match(self, node, match):
         """ Markup the match with a <i> tag.
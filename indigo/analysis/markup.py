@@ -1,3 +1,5 @@
+from itertools import chain
+
 from lxml import etree
 
 from indigo.xmlutils import wrap_text
@@ -24,6 +26,10 @@ class TextPatternMarker:
     """ Tag that will be used to markup matches.
     """
 
+    elements = None
+    """ If set, only these elements (and their descendants) are marked up, rather than all the ancestors.
+    """
+
     def setup(self, root):
         self.ns = root.nsmap[None]
         self.nsmap = {'a': self.ns}
@@ -92,12 +98,43 @@ class TextPatternMarker:
         return marker, match.start(0), match.end(0)
 
     def ancestor_nodes(self, root):
-        return self.ancestor_xpath(root)
+        ancestors = self.ancestor_xpath(root)
+        if self.elements is not None:
+            ancestors = restrict_to_elements(ancestors, self.elements)
+        return ancestors
 
     def candidate_nodes(self, root):
         return self.candidate_xpath(root)
 
 
+def restrict_to_elements(containers, elements):
+    """ Restrict work on +containers+ to the parts of them that are in +elements+.
+
+    Returns the containers that are (or are inside) one of the elements, followed by the outermost elements
+    that are inside one of the containers. No element is returned twice, and no element is returned
+    inside another element that is returned.
+    """
+    elements = list(dict.fromkeys(elements))
+    element_set = set(elements)
+    containers = list(containers)
+    container_set = set(containers)
+
+    whole = [c for c in containers if any(a in element_set for a in chain([c], c.iterancestors()))]
+    whole_set = set(whole)
+
+    parts = []
+    for element in elements:
+        if element in whole_set:
+            continue
+        ancestors = list(element.iterancestors())
+        if any(a in whole_set or a in element_set for a in ancestors):
+            continue
+        if any(a in container_set for a in ancestors):
+            parts.append(element)
+
+    return whole + parts
+
+
 class MultipleTextPatternMarker(TextPatternMarker):
     """ Marker to help marking up text based on a regular expression, where each match of the pattern
     may result in multiple markups. For example, a pattern matching section numbers may match
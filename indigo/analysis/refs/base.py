@@ -1,9 +1,11 @@
+from itertools import chain
 from lxml import etree
 import re
 
 from indigo.analysis.markup import TextPatternMarker, MultipleTextPatternMarker
 from indigo.plugins import LocaleBasedMatcher, plugins
 from indigo.xmlutils import closest
+from indigo_api.cap_numbers import cap_number_index
 from indigo_api.models import Subtype, Work
 
 
@@ -11,6 +13,7 @@ class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
     """ Finds references to Acts in documents.
     """
     marker_tag = 'ref'
+    local_work_uris = None
 
     def find_references_in_document(self, document):
         """ Find references in +document+, which is an Indigo Document object.
@@ -18,11 +21,21 @@ class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
+        self.find_references_in_tree(root, document)
+        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+
+    def find_references_in_tree(self, root, document, elements=None):
+        """ Find references in +root+, the parsed XML of +document+, changing the tree in place.
+
+        If +elements+ is given, only those elements of the tree are searched for references.
+        """
         self.document = document
+        self.elements = elements
         self.frbr_uri = document.doc.frbr_uri
+        self.root = root
+        self.local_work_uris = None
         self.setup(root)
         self.markup_patterns(root)
-        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
     def is_valid(self, node, match):
         if self.make_href(match) != self.frbr_uri.work_uri():
@@ -42,12 +55,34 @@ class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
         """
         link_uri = f"/akn/{self.frbr_uri.country}/act/{match.group('year')}/{match.group('num')}"
         if self.frbr_uri.locality:
-            local = f"/akn/{self.frbr_uri.country}-{self.frbr_uri.locality}/act/{match.group('year')}/{match.group('num')}"
-            if Work.objects.filter(frbr_uri=local).exists():
+            local = self.make_local_href(match)
+            if local in self.find_local_work_uris():
                 link_uri = local
 
         return link_uri
 
+    def make_local_href(self, match):
+        return f"/akn/{self.frbr_uri.country}-{self.frbr_uri.locality}/act/{match.group('year')}/{match.group('num')}"
+
+    def find_local_work_uris(self):
+        """ The set of local FRBR URIs referred to in the document that exist as works.
+
+        These are looked up with a single query the first time they're needed, rather than once per match.
+        """
+        if self.local_work_uris is None:
+            candidates = set()
+            for ancestor in self.ancestor_nodes(self.root):
+                for candidate in self.candidate_nodes(ancestor):
+                    for match in self.find_matches(candidate):
+                        if match.group('year') and match.group('num'):
+                            candidates.add(self.make_local_href(match))
+
+            self.local_work_uris = set(Work.objects
+                                       .filter(frbr_uri__in=candidates)
+                                       .values_list('frbr_uri', flat=True)) if candidates else set()
+
+        return self.local_work_uris
+
 
 @plugins.register('refs')
 class RefsFinderENG(BaseRefsFinder):
@@ -76,6 +111,36 @@ class RefsFinderENG(BaseRefsFinder):
     candidate_xpath = ".//text()[contains(., 'Act') and not(ancestor::a:ref)]"
 
 
+class SubtypeMatcher:
+    """ Patterns for finding references to works with subtypes, compiled from a list of subtypes.
+    """
+    def __init__(self, subtypes):
+        self.subtypes = subtypes
+        names = [s.name for s in subtypes] + [s.abbreviation for s in subtypes]
+        self.subtypes_string = '|'.join([re.escape(s) for s in names])
+
+        # TODO: disregard e.g. "6 May" in "GN 34 of 6 May 2020", but catch reference
+        self.pattern_re = re.compile(
+            fr'''
+                (?P<ref>
+                    (?P<subtype>{self.subtypes_string})\s*
+                    (No\.?\s*)?
+                    (?P<num>\d+)
+                    (\s+of\s+|/)
+                    (?P<year>\d{{4}})
+                )
+            ''', re.X | re.I)
+
+        # quickly check whether text mentions any subtype at all, before applying the full pattern
+        self.prefilter_re = re.compile(self.subtypes_string, re.I)
+
+        # lowercase subtype name or abbreviation to the abbreviation to use in FRBR URIs
+        self.abbreviations = {}
+        for s in subtypes:
+            self.abbreviations.setdefault(s.name.lower(), s.abbreviation)
+            self.abbreviations.setdefault(s.abbreviation.lower(), s.abbreviation)
+
+
 @plugins.register('refs-subtypes')
 class RefsFinderSubtypesENG(BaseRefsFinder):
     """ Finds references to works other than Acts in documents, of the form:
@@ -89,6 +154,9 @@ class RefsFinderSubtypesENG(BaseRefsFinder):
     # country, language, locality
     locale = (None, 'eng', None)
 
+    # (Subtype._version, SubtypeMatcher) shared by all instances
+    _matcher = (None, None)
+
     def setup(self, root):
         self.setup_subtypes()
         self.setup_candidate_xpath()
@@ -98,31 +166,31 @@ class RefsFinderSubtypesENG(BaseRefsFinder):
         if self.subtypes:
             super().setup(root)
 
-    def setup_subtypes(self):
-        self.subtypes = [s for s in Subtype.objects.all()]
-        self.subtype_names = [s.name for s in self.subtypes]
-        self.subtype_abbreviations = [s.abbreviation for s in self.subtypes]
+    @classmethod
+    def get_matcher(cls):
+        """ The matcher for the current subtypes. It is only rebuilt when subtypes change.
+        """
+        version, matcher = cls._matcher
+        if matcher is None or version != Subtype._version:
+            version = Subtype._version
+            matcher = SubtypeMatcher(list(Subtype.objects.all()))
+            cls._matcher = (version, matcher)
+        return matcher
 
-        self.subtypes_string = '|'.join([re.escape(s) for s in self.subtype_names + self.subtype_abbreviations])
+    def setup_subtypes(self):
+        self.matcher = self.get_matcher()
+        self.subtypes = self.matcher.subtypes
 
     def setup_candidate_xpath(self):
-        xpath_contains = " or ".join([f"contains(translate(., '{subtype.upper()}', '{subtype.lower()}'), "
-                                      f"'{subtype.lower()}')"
-                                      for subtype in self.subtype_names + self.subtype_abbreviations])
-        self.candidate_xpath = f".//text()[({xpath_contains}) and not(ancestor::a:ref)]"
+        # candidates are filtered by candidate_nodes
+        self.candidate_xpath = ".//text()[not(ancestor::a:ref)]"
 
     def setup_pattern_re(self):
-        # TODO: disregard e.g. "6 May" in "GN 34 of 6 May 2020", but catch reference
-        self.pattern_re = re.compile(
-            fr'''
-                (?P<ref>
-                    (?P<subtype>{self.subtypes_string})\s*
-                    (No\.?\s*)?
-                    (?P<num>\d+)
-                    (\s+of\s+|/)
-                    (?P<year>\d{{4}})
-                )
-            ''', re.X | re.I)
+        self.pattern_re = self.matcher.pattern_re
+
+    def candidate_nodes(self, root):
+        prefilter_re = self.matcher.prefilter_re
+        return [text for text in super().candidate_nodes(root) if prefilter_re.search(text)]
 
     def markup_patterns(self, root):
         # don't do anything if there are no subtypes
@@ -132,10 +200,7 @@ class RefsFinderSubtypesENG(BaseRefsFinder):
     def make_href(self, match):
         # use correct subtype for FRBR URI
         subtype = match.group('subtype')
-        for s in self.subtypes:
-            if subtype.lower() == s.name.lower() or subtype.lower() == s.abbreviation.lower():
-                subtype = s.abbreviation
-                break
+        subtype = self.matcher.abbreviations.get(subtype.lower(), subtype)
 
         place = f'{self.frbr_uri.country}'
         if self.frbr_uri.locality:
@@ -169,12 +234,7 @@ class RefsFinderCapENG(BaseRefsFinder):
         super().setup(root)
 
     def setup_cap_numbers(self, document):
-        country = document.work.country
-        locality = document.work.locality
-        place = locality or country
-        cap_strings = [p for p in place.settings.work_properties if p.startswith('cap')]
-
-        self.cap_numbers = {w.properties[c]: w.frbr_uri for c in cap_strings for w in Work.objects.filter(country=country, locality=locality) if w.properties.get(c)}
+        self.cap_numbers = cap_number_index.for_place(document.work.country, document.work.locality)
 
     def is_valid(self, node, match):
         return self.cap_numbers.get(match.group('num'))
@@ -200,9 +260,17 @@ class BaseInternalRefsFinder(LocaleBasedMatcher, MultipleTextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
+        self.find_references_in_tree(root, document)
+        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+
+    def find_references_in_tree(self, root, document, elements=None):
+        """ Find references in +root+, the parsed XML of +document+, changing the tree in place.
+
+        If +elements+ is given, only those elements of the tree are searched for references.
+        """
+        self.elements = elements
         self.setup(root)
         self.markup_patterns(root)
-        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
     def is_valid(self, node, match):
         return self.find_target(node, match) is not None
@@ -289,11 +357,26 @@ class SectionRefsFinderENG(BaseInternalRefsFinder):
     item_re = re.compile(r'(?P<ref>(?P<num>(?<!\()\d+[A-Z0-9]*(?!\))))(\s*\([A-Z0-9]+\))*', re.IGNORECASE)
 
     candidate_xpath = ".//text()[contains(translate(., 'S', 's'), 'section') and not(ancestor::a:ref)]"
-    match_cache = {}
+
+    def find_references_in_tree(self, root, document, elements=None):
+        if elements is not None and self.changes_sections(root, elements):
+            # the targets of references anywhere in the document may have changed
+            elements = None
+        super().find_references_in_tree(root, document, elements)
+
+    def changes_sections(self, root, elements):
+        """ Do any of these (changed) elements include sections, and so possibly section numbers?
+        """
+        section_tag = f'{{{root.nsmap[None]}}}section'
+        return any(next(e.iter(section_tag), None) is not None for e in elements)
 
     def setup(self, root):
         super().setup(root)
         self.ancestor_tags = set(f'{{{self.ns}}}{t}' for t in self.ancestors)
+        self.section_tag = f'{{{self.ns}}}section'
+        self.num_tag = f'{{{self.ns}}}num'
+        # ancestor element to a dict from section num text (eg. "26B.") to the first section with that num
+        self.section_index = {}
 
     def is_valid(self, node, match):
         # check that it's not an external reference
@@ -309,11 +392,19 @@ class SectionRefsFinderENG(BaseInternalRefsFinder):
         num = match.group('num')
         # find the closest ancestor to scope the lookups to
         ancestor = closest(node, lambda e: e.tag in self.ancestor_tags)
-        candidate_elements = ancestor.xpath(f".//a:section[a:num[text()='{num}.']]", namespaces=self.nsmap)
-        if candidate_elements:
-            self.match_cache[num] = candidate_elements[0]
-            return candidate_elements[0]
+        return self.sections_by_num(ancestor).get(f'{num}.')
 
-    def make_href(self, node, match):
-        target = self.match_cache[match.group('num')]
-        return '#' + target.get('eId')
+    def sections_by_num(self, ancestor):
+        """ A dict from the text of section nums to the first section (in document order) with that num,
+        in the given ancestor. This is built once for each ancestor.
+        """
+        index = self.section_index.get(ancestor)
+        if index is None:
+            index = self.section_index[ancestor] = {}
+            for section in ancestor.iter(self.section_tag):
+                for num in section.iterchildren(self.num_tag):
+                    # all text nodes directly inside the num, as for the xpath a:num[text()='26B.']
+                    for text in chain([num.text], (child.tail for child in num)):
+                        if text and text not in index:
+                            index[text] = section
+        return index
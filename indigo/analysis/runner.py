@@ -0,0 +1,181 @@
+import logging
+import time
+
+from lxml import etree
+
+from indigo.plugins import plugins
+from indigo.xmlutils import closest
+
+log = logging.getLogger(__name__)
+
+
+def defining_class(cls, name):
+    """ The class in the MRO of +cls+ that defines the attribute +name+, or None.
+    """
+    return next((c for c in cls.__mro__ if name in c.__dict__), None)
+
+
+def works_on_tree(finder, document_method, tree_method):
+    """ Can this plugin work on a shared tree, using +tree_method+, rather than on the document, using
+    +document_method+?
+
+    Only if the tree method is defined at least as specifically as the document method. A subclass that only
+    overrides the document method must have that method called, or its changes would be silently ignored.
+    """
+    tree_class = defining_class(type(finder), tree_method)
+    if tree_class is None:
+        return False
+    document_class = defining_class(type(finder), document_method)
+    return document_class is None or issubclass(tree_class, document_class)
+
+
+class AnalysisRunner:
+    """ Runs analysis plugins, such as reference finders and italics markup, over a document.
+
+    The document's XML is parsed once and each plugin changes the same tree. The document's content is
+    only updated (and so re-parsed) once, when `finish()` is called. Plugins that don't support working
+    on a shared tree are still run, but they are given the document with its latest content.
+
+    The time taken by each plugin, in seconds, is recorded in `timings` and logged by `finish()`.
+
+    If `eids` is given, only the elements with those eIds are analysed, on the basis that the rest of the document
+    has already been analysed and hasn't changed since. Plugins that can't be sure of getting the same results
+    as analysing the whole document (for example, because a definition has changed) fall back to analysing the
+    whole document.
+    """
+
+    reference_finders = ['refs', 'refs-subtypes', 'refs-cap', 'refs-act-names', 'internal-refs']
+    """ Plugins for finding references, in the order in which they're run.
+    """
+
+    def __init__(self, document, eids=None):
+        self.document = document
+        self.eids = set(eids) if eids is not None else None
+        self.timings = {}
+        self._root = None
+        self._elements = (None, None)
+        self.changed = False
+
+    @property
+    def root(self):
+        """ The etree of the document's XML, shared by all the analysis steps.
+        """
+        if self._root is None:
+            # we need to use etree, not objectify, so we can't use document.doc.root,
+            # we have to re-parse it
+            self._root = etree.fromstring(self.document.content)
+        return self._root
+
+    def elements(self):
+        """ The elements of the shared tree to analyse, or None to analyse the whole document.
+        """
+        if self.eids is None:
+            return None
+
+        root, elements = self._elements
+        if root is not self.root:
+            root = self.root
+            elements = [e for e in root.iter(etree.Element) if e.get('eId') in self.eids]
+            self._elements = (root, elements)
+        return elements
+
+    def link_terms(self):
+        """ Find and link defined terms.
+        """
+        finder = plugins.for_document('terms', self.document)
+        if finder:
+            if works_on_tree(finder, 'find_terms_in_document', 'find_terms'):
+                self.run('terms', lambda: finder.find_terms(self.root, self.elements()))
+            else:
+                self.run('terms', lambda: self.run_on_document(finder.find_terms_in_document))
+
+    def find_references(self):
+        """ Find and link references to other works and internal references.
+        """
+        for name in self.reference_finders:
+            finder = plugins.for_document(name, self.document)
+            if not finder:
+                continue
+
+            if works_on_tree(finder, 'find_references_in_document', 'find_references_in_tree'):
+                self.run(name, lambda: finder.find_references_in_tree(self.root, self.document, self.elements()))
+            else:
+                self.run(name, lambda: self.run_on_document(finder.find_references_in_document))
+
+    def mark_up_italics(self):
+        """ Mark up italics terms for the document's country.
+        """
+        finder = plugins.for_document('italics-terms', self.document)
+        italics_terms = self.document.work.country.italics_terms
+        if finder and italics_terms:
+            if works_on_tree(finder, 'mark_up_italics_in_document', 'mark_up_italics_in_tree'):
+                self.run('italics-terms', lambda: finder.mark_up_italics_in_tree(self.root, italics_terms, self.elements()))
+            else:
+                self.run('italics-terms', lambda: self.run_on_document(
+                    lambda document: finder.mark_up_italics_in_document(document, italics_terms)))
+
+    def run(self, name, step):
+        start = time.perf_counter()
+        step()
+        self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start
+        self.changed = True
+
+    def run_on_document(self, step):
+        """ Run a step that works on the document rather than the shared tree.
+        """
+        self.update_document()
+        step(self.document)
+        self._root = None
+
+    def update_document(self):
+        """ Update the document's content from the shared tree, if it has been parsed.
+        """
+        if self._root is not None:
+            self.document.content = etree.tostring(self._root, encoding='utf-8').decode('utf-8')
+
+    def finish(self):
+        """ Update the document with the results of the analysis.
+        """
+        if self.changed:
+            start = time.perf_counter()
+            self.update_document()
+            self.timings['update'] = time.perf_counter() - start
+            self.changed = False
+
+        if self.timings:
+            log.info(f"Analysed {self.document}: " + ", ".join(f"{name} {secs:.3f}s" for name, secs in self.timings.items()))
+
+
+def find_changed_eids(old_xml, new_xml):
+    """ Compare two versions of a document's XML and return the set of eIds of the outermost elements that have
+    changed, or None if the changes can't be described that way and the whole document has changed.
+
+    An element is only narrowed down to its changed children if everything else about it, including its
+    attributes, text and the tails of its children, is unchanged.
+    """
+    changed = []
+
+    def compare(old, new):
+        if etree.tostring(old, with_tail=False) == etree.tostring(new, with_tail=False):
+            return
+
+        old_kids = list(old)
+        new_kids = list(new)
+        if (old.tag == new.tag and dict(old.attrib) == dict(new.attrib) and old.text == new.text
+                and len(old_kids) == len(new_kids)
+                and all(o.tag == n.tag and o.tail == n.tail for o, n in zip(old_kids, new_kids))):
+            for o, n in zip(old_kids, new_kids):
+                compare(o, n)
+        else:
+            changed.append(new)
+
+    compare(etree.fromstring(old_xml), etree.fromstring(new_xml))
+
+    eids = set()
+    for element in changed:
+        element = closest(element, lambda e: e.get('eId'))
+        if element is None:
+            return None
+        eids.add(element.get('eId'))
+
+    return eids
@@ -1,14 +1,83 @@
 import re
 import logging
 from collections import Counter
+from functools import lru_cache
 from itertools import chain
 from lxml import etree
 
+from indigo.analysis.markup import restrict_to_elements
 from indigo.plugins import LocaleBasedMatcher
 
 log = logging.getLogger(__name__)
 
 
+def is_word_char(c):
+    # as for \w in a unicode regular expression
+    return c.isalnum() or c == '_'
+
+
+class TermMatcher(object):
+    """ Finds whole-word occurrences of a set of terms in text.
+
+    This matches exactly as the regular expression `\\b(term1|term2|...)\\b` does when the terms are sorted
+    longest first, but uses a trie of the terms so that the time taken doesn't grow with the number of terms.
+    """
+    def __init__(self, term_lookup):
+        """ :param term_lookup: dict from term to term id
+        """
+        self.trie = {}
+        for term, term_id in term_lookup.items():
+            node = self.trie
+            for c in term:
+                node = node.setdefault(c, {})
+            # None can't be a character, so it marks the end of a term
+            node[None] = term_id
+
+        # quickly find positions where a term could start
+        first_chars = ''.join(re.escape(c) for c in self.trie if c is not None)
+        self.start_re = re.compile(r'\b(?=[%s])' % first_chars) if first_chars else None
+
+    @classmethod
+    def for_terms(cls, term_lookup):
+        """ Get a (cached) matcher for this dict from term to term id.
+        """
+        return _cached_term_matcher(frozenset(term_lookup.items()))
+
+    def finditer(self, text):
+        """ Yield (start, end, term_id) tuples for non-overlapping matches in text, from left to right.
+        """
+        if not self.start_re:
+            return
+
+        pos = 0
+        while True:
+            start = self.start_re.search(text, pos)
+            if not start:
+                return
+            start = start.start()
+
+            # find the longest term starting here that also ends on a word boundary
+            match = None
+            node = self.trie
+            for end in range(start, len(text)):
+                node = node.get(text[end])
+                if node is None:
+                    break
+                if None in node and is_word_char(text[end]) != (end + 1 < len(text) and is_word_char(text[end + 1])):
+                    match = (start, end + 1, node[None])
+
+            if match:
+                yield match
+                pos = match[1]
+            else:
+                pos = start + 1
+
+
+@lru_cache(maxsize=32)
+def _cached_term_matcher(terms):
+    return TermMatcher(dict(terms))
+
+
 class BaseTermsFinder(LocaleBasedMatcher):
     """ Finds references to defined terms in documents.
 
@@ -38,13 +107,27 @@ class BaseTermsFinder(LocaleBasedMatcher):
         self.find_terms(root)
         document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
-    def find_terms(self, doc):
+    def find_terms(self, doc, elements=None):
+        """ Find and link defined terms in +doc+, changing the tree in place.
+
+        If +elements+ is given, only the references to terms in those elements (and in definition sections) are
+        linked, as long as the defined terms are the same as before. Otherwise, the whole document is searched.
+        """
         self.setup(doc)
 
+        previous_terms = self.find_existing_terms(doc)
         self.guess_at_definitions(doc)
         terms = self.find_definitions(doc)
         self.add_terms_to_references(doc, terms)
-        self.find_term_references(doc, terms)
+
+        if elements is not None:
+            if terms == previous_terms:
+                elements = list(elements) + list(self.definition_sections(doc))
+            else:
+                # references to the new or changed terms could be anywhere
+                elements = None
+
+        self.find_term_references(doc, terms, elements)
         self.renumber_terms(doc)
 
     def setup(self, doc):
@@ -61,7 +144,7 @@ class BaseTermsFinder(LocaleBasedMatcher):
         self.basic_unit_xpath = etree.XPath('//a:section', namespaces=self.nsmap)
         self.heading_xpath = etree.XPath('a:heading', namespaces=self.nsmap)
         self.defn_containers_xpath = etree.XPath('.//a:p|.//a:listIntroduction', namespaces=self.nsmap)
-        self.text_xpath = etree.XPath('//a:body//text()', namespaces=self.nsmap)
+        self.body_xpath = etree.XPath('//a:body[not(ancestor::a:body)]', namespaces=self.nsmap)
 
     def find_definitions(self, doc):
         """ Find `def` elements in the document and return a dict from term ids to the text of the term.
@@ -138,6 +221,14 @@ class BaseTermsFinder(LocaleBasedMatcher):
 
             yield section
 
+    def find_existing_terms(self, doc):
+        """ Return a dict from term ids to the text of the term, for the terms already in the references section.
+        """
+        refs = doc.xpath('//a:meta/a:references', namespaces=self.nsmap)
+        if not refs:
+            return {}
+        return {ref.get('eId'): ref.get('showAs') for ref in refs[0].iterchildren(self.tlc_term_tag)}
+
     def add_terms_to_references(self, doc, terms):
         """ Add defined terms to the references section of the XML.
         """
@@ -167,8 +258,8 @@ class BaseTermsFinder(LocaleBasedMatcher):
             ref = ref[5:]
         elem.set('href', self.ontology_template.format(language=self.language, term=ref))
 
-    def find_term_references(self, doc, terms):
-        """ Find and decorate references to terms in the document.
+    def find_term_references(self, doc, terms, elements=None):
+        """ Find and decorate references to terms in the document, or only in +elements+ if given.
         The +terms+ param is a dict from term_id to actual term.
         """
         if not terms:
@@ -176,66 +267,83 @@ class BaseTermsFinder(LocaleBasedMatcher):
 
         # term to term id
         term_lookup = self.make_term_index(terms)
+        matcher = TermMatcher.for_terms(term_lookup)
 
-        # big regex of all the terms, longest first
-        terms = sorted(term_lookup.keys(), key=lambda t: -len(t))
-        terms_re = re.compile(r'\b(%s)\b' % '|'.join(re.escape(t) for t in terms))
-
-        def make_term(match):
-            term_id = term_lookup[match.group(1)]
-            term = etree.Element(self.term_tag)
-            term.text = match.group()
-            term.set('refersTo', '#' + term_id)
-            return term
-
-        def in_own_defn(node, match):
-            # don't link to a term inside its own definition
-            term_id = '#' + term_lookup[match.group(1)]
-            for ancestor in node.iterancestors(self.ancestors):
-                if ancestor.get('refersTo'):
-                    return ancestor.get('refersTo') == term_id
+        bodies = self.body_xpath(doc)
+        if elements is not None:
+            bodies = restrict_to_elements(bodies, elements)
 
-        for candidate in self.text_xpath(doc):
-            node = candidate.getparent()
+        for element in bodies:
+            # state from above the element
+            in_markup = any(True for _ in element.iterancestors(self.no_term_markup))
+            refers_to = next((a.get('refersTo') for a in element.iterancestors(self.ancestors) if a.get('refersTo')), None)
+            self.find_term_references_in_element(element, matcher, in_markup, refers_to)
 
-            # skip if we're already inside a def or term element
-            if node.tag in self.no_term_markup or len(list(node.iterancestors(self.no_term_markup))) > 0:
-                continue
+    def find_term_references_in_element(self, element, matcher, in_markup, refers_to):
+        """ Find and decorate references to terms in the text and tails inside +element+, and then its children.
 
-            if not candidate.is_tail:
-                # text directly inside a node
-                for match in terms_re.finditer(node.text):
-                    log.debug("Matched " + match.group(1))
-                    if in_own_defn(node, match):
-                        log.debug("In own definition")
-                        continue
-
-                    term = make_term(match)
-                    node.text = match.string[:match.start()]
-                    node.insert(0, term)
-                    term.tail = match.string[match.end():]
-
-                    # now continue to check the new tail
-                    node = term
-                    break
+        :param in_markup: is an ancestor of element an element that must not be checked for terms?
+        :param refers_to: refersTo of the closest ancestor of element that could be a term's definition
+        """
+        # skip if we're already inside a def or term element
+        in_markup = in_markup or element.tag in self.no_term_markup
+        inner_refers_to = refers_to
+        if element.tag in self.ancestors and element.get('refersTo'):
+            inner_refers_to = element.get('refersTo')
+
+        if not in_markup and element.text:
+            # text directly inside a node; the node itself isn't considered when checking for its own definition
+            match = self.next_term_reference(element.text, matcher, refers_to)
+            if match:
+                text = element.text
+                term = self.make_term(text, match)
+                element.text = text[:match[0]]
+                element.insert(0, term)
+                term.tail = text[match[1]:]
+
+                # now continue to check the new tail
+                self.find_term_references_in_tail(term, matcher, inner_refers_to)
+
+        for child in list(element):
+            # comments and processing instructions have tails, but their text is not checked
+            if isinstance(child.tag, str):
+                self.find_term_references_in_element(child, matcher, in_markup, inner_refers_to)
+
+            if not in_markup and child.tag not in self.no_term_markup:
+                self.find_term_references_in_tail(child, matcher, inner_refers_to)
+
+    def find_term_references_in_tail(self, node, matcher, refers_to):
+        """ Find and decorate references to terms in the tail of +node+, and in the tails of the terms added after it.
+        """
+        while node.tail:
+            match = self.next_term_reference(node.tail, matcher, refers_to)
+            if not match:
+                break
 
-            while node is not None and node.tail:
-                for match in terms_re.finditer(node.tail):
-                    log.debug("Matched " + match.group(1))
-                    if in_own_defn(node, match):
-                        log.debug("In own definition")
-                        continue
+            text = node.tail
+            term = self.make_term(text, match)
+            node.addnext(term)
+            node.tail = text[:match[0]]
+            term.tail = text[match[1]:]
 
-                    term = make_term(match)
-                    node.addnext(term)
-                    node.tail = match.string[:match.start()]
-                    term.tail = match.string[match.end():]
+            # now continue to check the new tail
+            node = term
 
-                    # now continue to check the new tail
-                    node = term
-                    break
-                else:
-                    break
+    def next_term_reference(self, text, matcher, refers_to):
+        """ Find the first match for a term in text, ignoring terms inside their own definitions (which are
+        identified by +refers_to+).
+        """
+        for match in matcher.finditer(text):
+            # don't link to a term inside its own definition
+            if refers_to != '#' + match[2]:
+                return match
+
+    def make_term(self, text, match):
+        start, end, term_id = match
+        term = etree.Element(self.term_tag)
+        term.text = text[start:end]
+        term.set('refersTo', '#' + term_id)
+        return term
 
     def make_term_index(self, terms):
         return {v: k for k, v in terms.items()}
@@ -1,4 +1,8 @@
+import json
 import re
+from array import array
+from copy import copy
+from json.encoder import encode_basestring
 from functools import lru_cache
 
 from lxml import etree
@@ -43,6 +47,14 @@ def descend_toc_pre_order(items):
             yield descendant
 
 
+def descend_toc_json_pre_order(items):
+    # as for descend_toc_pre_order, but for TOC items as dicts
+    for item in items:
+        yield item
+        for descendant in descend_toc_json_pre_order(item.get('children', [])):
+            yield descendant
+
+
 def descend_toc_post_order(items):
     # yields each item's children, recursively, ending with itself
     for item in items:
@@ -304,42 +316,76 @@ class TOCBuilderBase(LocaleBasedMatcher):
             `id_set` is the current set of ids that have already been added to `provisions`;
                 it helps ensure that our list contains only unique provisions.
             `items` is a list of commenceable provisions from the current document's ToC.
+
+            Only `provisions` and `id_set` are changed. Existing provisions may be shared with earlier points in time,
+            so an existing provision whose children change is replaced with a copy, rather than being changed.
+            Returns True if anything changed.
         """
+        changed = False
         # TODO: allow for structural changes (sections moved into Parts etc)
         # take note of any removed items to compensate for later
-        removed_indexes = [i for i, p in enumerate(provisions) if p.id not in [i.id for i in items]]
-        for i, item in enumerate(items):
+        item_ids = set(item.id for item in items)
+        removed_indexes = set(i for i, p in enumerate(provisions) if p.id not in item_ids)
+
+        # The new list is built up in `merged` by taking existing provisions (from `source` onwards) as needed.
+        # The insertion index only ever increases, so this is a single pass over both lists.
+        merged = []
+        source = 0
+
+        def take(upto):
+            # take existing provisions until merged has upto items (or we run out)
+            nonlocal source
+            n = min(upto - len(merged), len(provisions) - source)
+            if n > 0:
+                merged.extend(provisions[source:source + n])
+                source += n
+
+        i = -1
+        for item in items:
             # We need to insert this provision at the correct position in the work provision list.
             # We also need to identify the right children based on the index.
             # If any provisions from a previous document have been removed in this document
             # (indexes stored in removed_indexes), bump the insertion index up to take them into account.
-            for n in removed_indexes:
-                if i >= n:
-                    i += 1
+            i += 1
+            while i in removed_indexes:
+                i += 1
 
             if item.id and item.id not in id_set:
                 id_set.add(item.id)
-                provisions.insert(i, item)
+                # as for list.insert, this appends the item if i is past the end
+                take(i)
+                merged.append(item)
+                changed = True
 
             # look at children and insert any provisions there too (ToC can be deeply nested)
-            if item.children:
-                try:
-                    existing_children = provisions[i].children
-                    existing_id_set = set([e.id for e in existing_children])
-                except IndexError:
-                    # the parent provision didn't exist previously
-                    existing_children = []
-                    existing_id_set = set()
-                self.insert_provisions(existing_children, existing_id_set, item.children)
+            # (if the parent provision didn't exist previously, there's nothing to insert into)
+            if item.children and i < len(merged) + len(provisions) - source:
+                take(i + 1)
+                existing = merged[i]
+                existing_children = list(existing.children)
+                existing_id_set = set([e.id for e in existing_children])
+                if self.insert_provisions(existing_children, existing_id_set, item.children):
+                    existing = copy(existing)
+                    existing.children = existing_children
+                    merged[i] = existing
+                    changed = True
+
+        take(len(merged) + len(provisions) - source)
+        provisions[:] = merged
+        return changed
 
 
 class TOCElement(object):
     """
     An element in the table of contents of a document, such as a chapter, part or section.
 
+    TOC elements use slots to keep their memory footprint small, because many of them may be kept,
+    such as in the cached commenceable provisions of works.
+
     :ivar children: further TOC elements contained in this one, defaults to empty list
     :ivar component: component name (after the ! in the FRBR URI) of the component that this item is a part of
-    :ivar element: :class:`lxml.objectify.ObjectifiedElement` the XML element of this TOC element
+    :ivar element: :class:`lxml.objectify.ObjectifiedElement` the XML element of this TOC element,
+        or None if it has been detached
     :ivar heading: heading for this element, excluding the number, may be None
     :ivar id: XML id string of the node in the document, may be None
     :ivar num: number of this element, as a string, may be None
@@ -349,6 +395,12 @@ class TOCElement(object):
     :ivar type: element type, one of: ``chapter, part, section`` etc.
     :ivar basic_unit: boolean, defaults to False.
     """
+    __slots__ = ('element', 'component', 'type', 'heading', 'id', 'num', 'children', 'subcomponent', 'title',
+                 'qualified_id', 'basic_unit')
+
+    json_fields = ('type', 'component', 'subcomponent', 'title', 'children', 'basic_unit', 'num', 'id', 'heading')
+    """ The fields of the JSON description of an element, in order.
+    """
 
     def __init__(self, element, component, type_, heading=None, id_=None, num=None, subcomponent=None, children=None, component_id=None, basic_unit=False):
         self.element = element
@@ -363,6 +415,14 @@ class TOCElement(object):
         self.qualified_id = id_ if component == 'main' else f"{component_id}/{id_}"
         self.basic_unit = basic_unit
 
+    def detach(self):
+        """ Drop references to XML elements from this element and its descendants, so that the XML tree
+        can be freed while the TOC is kept.
+        """
+        for item in descend_toc_pre_order([self]):
+            item.element = None
+        return self
+
     def as_dict(self):
         return {
             'type': self.type,
@@ -377,9 +437,156 @@ class TOCElement(object):
         }
 
 
+def json_value(value):
+    """ Encode a single scalar TOC value as JSON.
+    """
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return json.dumps(value)
+
+
+# the JSON keys, with their separators, that precede each field of a TOC element
+toc_json_keys = [(',' if i else '{') + encode_basestring(f) + ':' for i, f in enumerate(TOCElement.json_fields)]
+
+
+def toc_to_json(items):
+    """ Encode a list of TOC elements as a JSON string, equivalent to encoding the result of calling
+    `as_dict()` on each, but without building the intermediate dicts.
+    """
+    parts = []
+    write = parts.append
+    keys = list(zip(toc_json_keys, TOCElement.json_fields))
+
+    def encode(items):
+        write('[')
+        for i, item in enumerate(items):
+            if i:
+                write(',')
+            for key, field in keys:
+                write(key)
+                if field == 'children':
+                    encode(item.children)
+                else:
+                    write(json_value(getattr(item, field)))
+            write('}')
+        write(']')
+
+    encode(items)
+    return ''.join(parts)
+
+
+class FlatTOC:
+    """ A compact, read-only table of contents that is stored as parallel lists of the fields of its elements,
+    in pre-order, rather than as a tree of objects. This uses much less memory than :class:`TOCElement` instances
+    for large tables of contents that must be kept, and it doesn't refer to the XML.
+
+    The element at index `i` has its parent's index at `parents[i]` (-1 for top-level elements), and its
+    descendants are at indexes `i + 1` up to (but excluding) `ends[i]`.
+    """
+    fields = ('type', 'component', 'subcomponent', 'title', 'basic_unit', 'num', 'id', 'heading', 'qualified_id')
+
+    def __init__(self, columns, parents, ends):
+        self.columns = columns
+        self.parents = parents
+        self.ends = ends
+
+    @classmethod
+    def from_toc(cls, toc):
+        """ Build a flat TOC from a list of :class:`TOCElement` instances.
+        """
+        columns = {f: [] for f in cls.fields}
+        parents = array('l')
+        ends = array('l')
+
+        def add(items, parent):
+            for item in items:
+                index = len(parents)
+                for f, column in columns.items():
+                    column.append(getattr(item, f))
+                parents.append(parent)
+                ends.append(0)
+                add(item.children, index)
+                ends[index] = len(parents)
+
+        add(toc, -1)
+        return cls({f: tuple(column) for f, column in columns.items()}, parents, ends)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def get(self, index, field):
+        return self.columns[field][index]
+
+    def children(self, index=None):
+        """ The indexes of the children of the element at `index`, or of the top-level elements if `index` is None.
+        """
+        i, end = (0, len(self)) if index is None else (index + 1, self.ends[index])
+        while i < end:
+            yield i
+            i = self.ends[i]
+
+    def to_toc(self, index=None):
+        """ Rebuild the children of the element at `index` (or the top-level elements if `index` is None)
+        as detached :class:`TOCElement` instances.
+        """
+        items = []
+        for i in self.children(index):
+            item = TOCElement.__new__(TOCElement)
+            item.element = None
+            for f in self.fields:
+                setattr(item, f, self.columns[f][i])
+            item.children = self.to_toc(i)
+            items.append(item)
+        return items
+
+    def as_json(self):
+        """ Encode this TOC as a JSON string, in the same form as :func:`toc_to_json`.
+        """
+        parts = []
+        write = parts.append
+        # children aren't a column
+        keys = [(key, self.columns.get(f)) for key, f in zip(toc_json_keys, TOCElement.json_fields)]
+
+        def encode(index):
+            write('[')
+            for n, i in enumerate(self.children(index)):
+                if n:
+                    write(',')
+                for key, column in keys:
+                    write(key)
+                    if column is None:
+                        # children
+                        encode(i)
+                    else:
+                        write(json_value(column[i]))
+                write('}')
+            write(']')
+
+        encode(None)
+        return ''.join(parts)
+
+
 class BeautifulElement:
+    """ A TOC element, decorated with information for describing commenced provisions.
+
+    The most commonly used attributes of the TOC element are copied, for speed.
+    """
+    __slots__ = ('toc_element', 'id', 'type', 'basic_unit', 'title', 'num', 'children',
+                 'commenced', 'last_node', 'all_descendants_same', 'all_descendants_opposite',
+                 'container', 'full_container', 'visible', 'visible_descendants')
+
     def __init__(self, toc_element):
         self.toc_element = toc_element
+        self.id = toc_element.id
+        self.type = toc_element.type
+        self.basic_unit = toc_element.basic_unit
+        self.title = toc_element.title
         self.num = toc_element.num.strip('.') if toc_element.num else ''
         self.children = [BeautifulElement(c) for c in toc_element.children]
         # info that'll get added at decorate_provisions and elsewhere as booleans
@@ -392,8 +599,25 @@ class BeautifulElement:
         self.visible = None
         self.visible_descendants = None
 
-    def __getattr__(self, item):
-        return getattr(self.toc_element, item)
+    @property
+    def element(self):
+        return self.toc_element.element
+
+    @property
+    def component(self):
+        return self.toc_element.component
+
+    @property
+    def subcomponent(self):
+        return self.toc_element.subcomponent
+
+    @property
+    def heading(self):
+        return self.toc_element.heading
+
+    @property
+    def qualified_id(self):
+        return self.toc_element.qualified_id
 
 
 @plugins.register('commencements-beautifier')
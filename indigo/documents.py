@@ -1,6 +1,73 @@
+from indigo.analysis.toc.base import descend_toc_pre_order
 from indigo.plugins import plugins
 
 
+class DocumentIndex(object):
+    """ An index of the elements in a parsed document, so that elements can be found by eId, or by component
+    and subcomponent (such as `chapter/2` or `section/13A`), without searching the whole document each time.
+
+    Each part of the index is built the first time it is needed. The index must be discarded when the
+    document's XML changes.
+    """
+    def __init__(self, document):
+        self.document = document
+        self.doc = document.doc
+        self._components = None
+        self._attachments = None
+        self._subcomponents = None
+        self._eids = {}
+
+    @property
+    def components(self):
+        """ Component name to component element, as for `StructuredDocument.components()`.
+        """
+        if self._components is None:
+            self._components = self.doc.components()
+        return self._components
+
+    def attachment(self, eid):
+        """ The top-level attachment with the given eId, or None.
+        """
+        if self._attachments is None:
+            self._attachments = {}
+            for attachment in self.doc.main.xpath('./a:attachments/a:attachment', namespaces={'a': self.doc.namespace}):
+                self._attachments.setdefault(attachment.get('eId'), attachment)
+        return self._attachments.get(eid)
+
+    def eids(self, scope):
+        """ Dict from eId to the first element (in document order) with that eId that is a descendant of scope.
+        """
+        eids = self._eids.get(scope)
+        if eids is None:
+            eids = self._eids[scope] = {}
+            for element in scope.iterdescendants(f'{{{self.doc.namespace}}}*'):
+                eid = element.get('eId')
+                if eid is not None and eid not in eids:
+                    eids[eid] = element
+        return eids
+
+    def element_by_eid(self, component, eid):
+        """ The element with the given eId in the named component (including the component itself), or None.
+        """
+        component_el = self.components.get(component)
+        if component_el is None:
+            return None
+
+        if component_el.get('eId') == eid:
+            return component_el
+
+        return self.eids(component_el).get(eid)
+
+    def subcomponent(self, component, subcomponent):
+        """ The element for the first entry in the table of contents with this component and subcomponent, or None.
+        """
+        if self._subcomponents is None:
+            self._subcomponents = {}
+            for item in descend_toc_pre_order(self.document.table_of_contents()):
+                self._subcomponents.setdefault((item.component, item.subcomponent), item.element)
+        return self._subcomponents.get((component, subcomponent))
+
+
 class ResolvedAnchor(object):
     """ An anchor that has been resolved into a point in a document.
     """
@@ -24,15 +91,12 @@ class ResolvedAnchor(object):
 
     def resolve(self, exact):
         anchor_id = self.anchor_id
-        component = None
+        index = self.document.element_index()
 
         if '/' in anchor_id:
             prefix, anchor_id = anchor_id.split('/', 1)
-            escaped = prefix.replace("'", "\\'")
             # find the attachment with this id
-            results = list(self.document.doc.main.xpath(f"./a:attachments/a:attachment[@eId='{escaped}']", namespaces={'a': self.document.doc.namespace}))
-            if len(results):
-                component = results[0]
+            component = index.attachment(prefix)
         else:
             component = self.document.doc.main
 
@@ -40,17 +104,17 @@ class ResolvedAnchor(object):
             return
 
         self.exact_match = True
+        eids = index.eids(component)
 
         while anchor_id:
-            escaped = anchor_id.replace("'", "\\'")
-            elems = component.xpath(f".//a:*[@eId='{escaped}']", namespaces={'a': self.document.doc.namespace})
-            if len(elems):
-                self.resolve_element(elems[0])
+            element = eids.get(anchor_id)
+            if element is not None:
+                self.resolve_element(element)
                 break
             elif anchor_id in ['preface', 'preamble']:
                 # HACK HACK HACK
                 # We sometimes use 'preamble' and 'preface' even though they aren't IDs
-                elems = component.xpath(f".//a:{escaped}", namespaces={'a': self.document.doc.namespace})
+                elems = component.xpath(f".//a:{anchor_id}", namespaces={'a': self.document.doc.namespace})
                 if len(elems):
                     self.resolve_element(elems[0])
                     break
@@ -5,12 +5,12 @@ import tempfile
 from zipfile import BadZipFile
 import math
 
-from lxml import html, etree
+from lxml import html
 from lxml.html.clean import Cleaner
 import cssutils
 import mammoth
 
-from indigo.xmlutils import unwrap_element, merge_adjacent
+from indigo.xmlutils import unwrap_element, merge_adjacent, load_xslt
 from indigo_api.utils import filename_candidates, find_best_static
 from .pipeline import Stage, ImportAttachment, Pipeline
 
@@ -253,7 +253,7 @@ class HtmlToSlawText(Stage):
         if not xslt_filename:
             raise ValueError(f"Couldn't find XSLT file to use for {context.doc}, tried: {candidates}")
 
-        xslt = etree.XSLT(etree.parse(xslt_filename))
+        xslt = load_xslt(xslt_filename)
         context.text = str(xslt(context.html))
 
 
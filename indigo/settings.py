@@ -144,6 +144,28 @@ INDIGO = {
     # see http://docs.oasis-open.org/legaldocml/akn-core/v1.0/os/part1-vocabulary/akn-core-v1.0-os-part1-vocabulary.html#_Toc523925025
     'DOCTYPES': [('Act', 'act')],
     'EXTRA_DOCTYPES': {},
+
+    # Django cache alias used to store HTML rendered from document XML
+    'RENDERED_HTML_CACHE': 'default',
+
+    # Should published documents be pre-rendered as HTML, PDF and ePUB in the background when they change?
+    # Requires a separate task runner for django-background-tasks.
+    'PRERENDER_DOCUMENTS': False,
+
+    # Should the diffs between new versions of documents and their previous versions be computed in the background,
+    # when the versions are created? Requires a separate task runner for django-background-tasks.
+    'PRECOMPUTE_REVISION_DIFFS': False,
+
+    # Should multi-document PDFs be rendered one document at a time in parallel, and then joined together?
+    'PDF_PARALLEL_RENDER_MANY': False,
+    # Number of threads to use when rendering multi-document PDFs in parallel (None means a default based on CPUs)
+    'PDF_PARALLEL_RENDER_MANY_WORKERS': None,
+
+    # Number of processes to use when analysing documents in bulk (None means the number of CPUs)
+    'BULK_ANALYSIS_PROCESSES': None,
+
+    # Number of parsed documents to keep in memory in each process, for re-use across requests
+    'PARSED_DOCUMENT_CACHE_SIZE': 50,
 }
 
 # Database
@@ -3,7 +3,7 @@ from lxml import etree
 
 from django.test import TestCase
 
-from indigo.analysis.italics_terms import BaseItalicsFinder
+from indigo.analysis.italics_terms import BaseItalicsFinder, ItalicsMatcher
 from indigo_api.models import Document, Work
 from indigo_api.tests.fixtures import document_fixture
 
@@ -100,3 +100,11 @@ class ItalicsMarkupTestCase(TestCase):
         root = etree.fromstring(expected.content)
         expected.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
         self.assertEqual(expected.content, document.content)
+
+    def test_matcher_cached(self):
+        matcher = ItalicsMatcher.for_terms(self.italics_terms)
+        self.assertIs(matcher, ItalicsMatcher.for_terms(list(self.italics_terms)))
+        self.assertIsNot(matcher, ItalicsMatcher.for_terms(self.italics_terms + ['mutatis mutandis']))
+
+        self.assertTrue(matcher.prefilter('the Government Gazette'))
+        self.assertFalse(matcher.prefilter('nothing to see here'))
@@ -2,12 +2,13 @@
 from lxml import etree
 
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from cobalt import FrbrUri
 
 from indigo.analysis.refs.base import SectionRefsFinderENG, RefsFinderENG, RefsFinderSubtypesENG, RefsFinderCapENG
 
+from indigo_api.cap_numbers import cap_number_index
 from indigo_api.models import Document, Language, Work, Country, User, Subtype
 from indigo_api.tests.fixtures import document_fixture
 
@@ -815,15 +816,66 @@ class RefsFinderENGTestCase(TestCase):
         self.assertEqual(expected.content, document.content)
 
 
+class RefsFinderENGLocalTestCase(TestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work']
+
+    def setUp(self):
+        self.work = Work.objects.get(frbr_uri='/akn/za-cpt/act/2005/1')
+        self.finder = RefsFinderENG()
+        self.eng = Language.for_code('eng')
+        self.maxDiff = None
+
+    def test_find_local(self):
+        document = Document(
+            work=self.work,
+            document_xml=document_fixture(
+                xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <heading>Tester</heading>
+          <paragraph eId="sec_1.paragraph-0">
+            <content>
+              <p>Something to do with Act 1 of 2005 and Act no 22 of 2012.</p>
+              <p>And another thing about Act 4 of 1998 and Act 1 of 2005.</p>
+            </content>
+          </paragraph>
+        </section>"""
+            ),
+            language=self.eng)
+        document.doc.frbr_uri = FrbrUri.parse('/akn/za-cpt/act/2020/1')
+
+        # all the local works are looked up at once
+        with self.assertNumQueries(1):
+            self.finder.find_references_in_document(document)
+
+        root = etree.fromstring(document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <heading>Tester</heading>
+          <paragraph eId="sec_1.paragraph-0">
+            <content>
+              <p>Something to do with Act <ref href="/akn/za-cpt/act/2005/1">1 of 2005</ref> and Act <ref href="/akn/za/act/2012/22">no 22 of 2012</ref>.</p>
+              <p>And another thing about Act <ref href="/akn/za/act/1998/4">4 of 1998</ref> and Act <ref href="/akn/za-cpt/act/2005/1">1 of 2005</ref>.</p>
+            </content>
+          </paragraph>
+        </section>"""))
+        self.assertEqual(etree.tostring(root, encoding='utf-8').decode('utf-8'), document.content)
+
+
 class RefsFinderSubtypesENGTestCase(TestCase):
     fixtures = ['languages_data', 'countries', 'subtype']
 
     def setUp(self):
+        # the matcher is shared across tests, but the subtypes it was built from may have been rolled back
+        RefsFinderSubtypesENG._matcher = (None, None)
         self.work = Work(frbr_uri='/akn/za/act/1991/1')
         self.finder = RefsFinderSubtypesENG()
         self.eng = Language.for_code('eng')
         self.maxDiff = None
 
+    def tearDown(self):
+        RefsFinderSubtypesENG._matcher = (None, None)
+
     def test_find_simple(self):
         document = Document(
             work=self.work,
@@ -864,6 +916,17 @@ class RefsFinderSubtypesENGTestCase(TestCase):
         expected.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
         self.assertEqual(expected.content, document.content)
 
+    def test_matcher_cached(self):
+        matcher = RefsFinderSubtypesENG.get_matcher()
+        with self.assertNumQueries(0):
+            self.assertIs(matcher, RefsFinderSubtypesENG.get_matcher())
+
+        # changing subtypes rebuilds the matcher
+        Subtype.objects.create(name='Rule', abbreviation='rule')
+        matcher = RefsFinderSubtypesENG.get_matcher()
+        self.assertIn('rule', matcher.abbreviations)
+        self.assertEqual('p', matcher.abbreviations['proclamation'])
+
 
 class RefsFinderCapENGTestCase(TestCase):
     fixtures = ['languages_data', 'countries', 'user']
@@ -930,3 +993,38 @@ class RefsFinderCapENGTestCase(TestCase):
         self.assertEqual(expected.content, document.content)
         # set back to what it is in settings.py
         settings.INDIGO['WORK_PROPERTIES'] = {}
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cap_number_index(self):
+        za = Country.objects.get(pk=1)
+        user1 = User.objects.get(pk=1)
+        settings.INDIGO['WORK_PROPERTIES'] = {
+            'za': {
+                'cap': 'Chapter (cap)',
+            }
+        }
+
+        work = Work(
+            frbr_uri='/akn/za/act/2002/5',
+            title='Act 5 of 2002',
+            country=za,
+            created_by_user=user1,
+        )
+        work.properties['cap'] = '12'
+        work.updated_by_user = user1
+        work.save()
+
+        self.assertEqual({'12': '/akn/za/act/2002/5'}, cap_number_index.for_place(za, None))
+
+        # the cached index is updated as works change
+        work.properties['cap'] = '13'
+        work.save()
+        with self.assertNumQueries(0):
+            self.assertEqual({'13': '/akn/za/act/2002/5'}, cap_number_index.for_place(za, None))
+
+        work.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual({}, cap_number_index.for_place(za, None))
+
+        # set back to what it is in settings.py
+        settings.INDIGO['WORK_PROPERTIES'] = {}
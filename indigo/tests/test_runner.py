@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+from django.test import SimpleTestCase
+from mock import patch
+
+from indigo.analysis.refs.base import RefsFinderENG, SectionRefsFinderENG
+from indigo.analysis.terms.base import BaseTermsFinder
+from indigo.analysis.runner import AnalysisRunner, find_changed_eids, works_on_tree
+from indigo_api.models import Document, Work
+from indigo_api.tests.fixtures import document_fixture
+
+
+class DocumentOnlyFinder:
+    """ A finder that doesn't support working on a shared tree.
+    """
+    def find_references_in_document(self, document):
+        document.content = document.content.replace('<p>Other.</p>', '<p>Changed.</p>')
+
+
+class OverridingRefsFinder(RefsFinderENG):
+    """ A finder that overrides the document method, but not the tree method.
+    """
+    def find_references_in_document(self, document):
+        super().find_references_in_document(document)
+        document.content = document.content.replace('<p>Other.</p>', '<p>Overridden.</p>')
+
+
+class OverridingTermsFinder(BaseTermsFinder):
+    """ A terms finder that overrides the document method, but not the tree method.
+    """
+    def find_terms_in_document(self, document):
+        document.content = document.content.replace('<p>Other.</p>', '<p>Overridden.</p>')
+
+
+class AnalysisRunnerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.work = Work(frbr_uri='/akn/za/act/2005/1')
+        self.finders = {
+            'refs': RefsFinderENG(),
+            'refs-act-names': DocumentOnlyFinder(),
+            'internal-refs': SectionRefsFinderENG(),
+        }
+
+    def test_find_references(self):
+        document = Document(work=self.work, document_xml=document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <content>
+            <p>See Act 5 of 2001 and section 2.</p>
+          </content>
+        </section>
+        <section eId="sec_2">
+          <num>2.</num>
+          <content>
+            <p>Other.</p>
+          </content>
+        </section>"""))
+
+        with patch('indigo.plugins.plugins.for_document', side_effect=lambda name, doc: self.finders.get(name)):
+            runner = AnalysisRunner(document)
+            runner.find_references()
+            runner.finish()
+
+        self.assertIn('<p>See Act <ref href="/akn/za/act/2001/5">5 of 2001</ref> and <ref href="#sec_2">section 2</ref>.</p>',
+                      document.content)
+        self.assertIn('<p>Changed.</p>', document.content)
+        self.assertEqual(['refs', 'refs-act-names', 'internal-refs', 'update'], list(runner.timings.keys()))
+
+    def test_find_references_overridden_document_method(self):
+        document = Document(work=self.work, document_xml=document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <content>
+            <p>See Act 5 of 2001.</p>
+            <p>Other.</p>
+          </content>
+        </section>"""))
+        self.finders = {'refs': OverridingRefsFinder()}
+
+        with patch('indigo.plugins.plugins.for_document', side_effect=lambda name, doc: self.finders.get(name)):
+            runner = AnalysisRunner(document)
+            runner.find_references()
+            runner.finish()
+
+        self.assertIn('<p>See Act <ref href="/akn/za/act/2001/5">5 of 2001</ref>.</p>', document.content)
+        self.assertIn('<p>Overridden.</p>', document.content)
+
+    def test_link_terms_overridden_document_method(self):
+        document = Document(work=self.work, document_xml=document_fixture(text='Other.'))
+
+        with patch('indigo.plugins.plugins.for_document', side_effect=lambda name, doc: OverridingTermsFinder()):
+            runner = AnalysisRunner(document, eids=['sec_1'])
+            runner.link_terms()
+            runner.finish()
+
+        self.assertIn('<p>Overridden.</p>', document.content)
+
+    def test_find_references_in_changed_elements(self):
+        document = Document(work=self.work, document_xml=self.changed_elements_fixture())
+
+        with patch('indigo.plugins.plugins.for_document', side_effect=lambda name, doc: self.finders.get(name)):
+            runner = AnalysisRunner(document, eids=['sec_2__subsec_1'])
+            runner.find_references()
+            runner.finish()
+
+        # only the changed subsection is analysed
+        self.assertIn('<p>See section 2.</p>', document.content)
+        self.assertIn('<p>See <ref href="#sec_1">section 1</ref>.</p>', document.content)
+
+    def test_find_references_in_changed_sections(self):
+        document = Document(work=self.work, document_xml=self.changed_elements_fixture())
+
+        with patch('indigo.plugins.plugins.for_document', side_effect=lambda name, doc: self.finders.get(name)):
+            runner = AnalysisRunner(document, eids=['sec_2'])
+            runner.find_references()
+            runner.finish()
+
+        # a changed section could change the targets of other references, so everything is analysed
+        self.assertIn('<p>See <ref href="#sec_2">section 2</ref>.</p>', document.content)
+        self.assertIn('<p>See <ref href="#sec_1">section 1</ref>.</p>', document.content)
+
+    def changed_elements_fixture(self):
+        return document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <content>
+            <p>See section 2.</p>
+          </content>
+        </section>
+        <section eId="sec_2">
+          <num>2.</num>
+          <subsection eId="sec_2__subsec_1">
+            <content>
+              <p>See section 1.</p>
+            </content>
+          </subsection>
+        </section>""")
+
+    def test_find_changed_eids(self):
+        old = document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <subsection eId="sec_1__subsec_1">
+            <content>
+              <p>Old text.</p>
+            </content>
+          </subsection>
+        </section>
+        <section eId="sec_2">
+          <num>2.</num>
+          <content>
+            <p>Other.</p>
+          </content>
+        </section>""")
+
+        self.assertEqual(set(), find_changed_eids(old, old))
+        self.assertEqual({'sec_1__subsec_1'}, find_changed_eids(old, old.replace('Old text', 'New text')))
+        self.assertEqual({'sec_1', 'sec_2'}, find_changed_eids(old, old.replace('<num>1.</num>', '<num>1A.</num>')
+                                                                    .replace('Other', 'Changed')))
+        # a new section changes the body, which doesn't have an eId
+        self.assertIsNone(find_changed_eids(old, old.replace('</section>', '</section><section eId="sec_3"/>', 1)))
+
+    def test_works_on_tree(self):
+        self.assertTrue(works_on_tree(RefsFinderENG(), 'find_references_in_document', 'find_references_in_tree'))
+        # the tree method is overridden, more specifically than the document method
+        self.assertTrue(works_on_tree(SectionRefsFinderENG(), 'find_references_in_document', 'find_references_in_tree'))
+        self.assertFalse(works_on_tree(OverridingRefsFinder(), 'find_references_in_document', 'find_references_in_tree'))
+        self.assertFalse(works_on_tree(DocumentOnlyFinder(), 'find_references_in_document', 'find_references_in_tree'))
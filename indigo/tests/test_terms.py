@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import re
+
+from django.test import SimpleTestCase
+
+from indigo.analysis.terms.base import TermMatcher
+
+
+class TermMatcherTestCase(SimpleTestCase):
+    def assert_same_as_regex(self, term_lookup, text):
+        terms = sorted(term_lookup.keys(), key=lambda t: -len(t))
+        terms_re = re.compile(r'\b(%s)\b' % '|'.join(re.escape(t) for t in terms))
+        expected = [(m.start(), m.end(), term_lookup[m.group(1)]) for m in terms_re.finditer(text)]
+
+        self.assertEqual(expected, list(TermMatcher(term_lookup).finditer(text)))
+
+    def test_longest_match(self):
+        lookup = {'Act': 'term-Act', 'the Act': 'term-the_Act', 'Minister': 'term-Minister'}
+        self.assertEqual([
+            (4, 11, 'term-the_Act'),
+            (17, 20, 'term-Act'),
+            (26, 34, 'term-Minister'),
+        ], list(TermMatcher(lookup).finditer('And the Act, any Act, and Minister.')))
+
+    def test_word_boundaries(self):
+        lookup = {
+            'Act': 'term-Act',
+            'act': 'term-act',
+            '(a)': 'term-a',
+            'Rules (2005)': 'term-Rules',
+            'x.': 'term-x',
+            'a_b': 'term-a_b',
+            'Öffice': 'term-Office',
+        }
+        for text in [
+            'Acts and Act, the acts act_ act',
+            'item(a) and (a) and x(a)y',
+            'the Rules (2005)and Rules (2005) x. x.y',
+            'a_b a_bc Öffice Öffices',
+            '',
+        ]:
+            self.assert_same_as_regex(lookup, text)
+
+    def test_cached(self):
+        lookup = {'Act': 'term-Act'}
+        self.assertIs(TermMatcher.for_terms(lookup), TermMatcher.for_terms(dict(lookup)))
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
-from copy import copy
+import json
+from copy import copy, deepcopy
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from indigo_api.tests.fixtures import document_fixture, component_fixture
 from indigo_api.models import Document, Language, Work
 
-from indigo.analysis.toc.base import TOCBuilderBase, descend_toc_pre_order
+from indigo.analysis.toc.base import TOCBuilderBase, TOCElement, FlatTOC, BeautifulElement, descend_toc_pre_order, \
+    toc_to_json
 
 
 class TOCBuilderBaseTestCase(TestCase):
@@ -402,3 +404,68 @@ class TOCBuilderBaseTestCase(TestCase):
             'heading': None,
         })
         self.assertEqual(toc.id, toc.qualified_id)
+
+
+class TOCElementTestCase(SimpleTestCase):
+    def setUp(self):
+        self.element = object()
+        part = TOCElement(self.element, 'main', 'part', heading='Général "One"', id_='part_1', num='1',
+                          subcomponent='part/1', children=[
+                              TOCElement(self.element, 'main', 'section', id_='part_1__sec_1', num='1.', subcomponent='section/1',
+                                         basic_unit=True, children=[
+                                             TOCElement(self.element, 'main', 'subsection', id_='part_1__sec_1__subsec_1', num='(1)'),
+                                         ]),
+                              TOCElement(self.element, 'main', 'section', id_='part_1__sec_2', num='2.', subcomponent='section/2',
+                                         basic_unit=True),
+                          ])
+        schedule = TOCElement(self.element, 'schedule', 'attachment', heading='Schedule', id_='att_1',
+                              component_id='att_1')
+        for item in descend_toc_pre_order([part, schedule]):
+            item.title = f'{item.type} {item.num}'
+        self.toc = [part, schedule]
+
+    def test_toc_to_json(self):
+        self.assertEqual([t.as_dict() for t in self.toc], json.loads(toc_to_json(self.toc)))
+        self.assertEqual(json.dumps([t.as_dict() for t in self.toc], ensure_ascii=False, separators=(',', ':')),
+                         toc_to_json(self.toc))
+        self.assertEqual('[]', toc_to_json([]))
+
+    def test_flat_toc(self):
+        flat = FlatTOC.from_toc(self.toc)
+        self.assertEqual(5, len(flat))
+        self.assertEqual([-1, 0, 1, 0, -1], list(flat.parents))
+        self.assertEqual([0, 4], list(flat.children()))
+        self.assertEqual([1, 3], list(flat.children(0)))
+        self.assertEqual([], list(flat.children(2)))
+        self.assertEqual('part_1__sec_2', flat.get(3, 'id'))
+        self.assertEqual('att_1/att_1', flat.get(4, 'qualified_id'))
+
+        self.assertEqual(toc_to_json(self.toc), flat.as_json())
+
+        toc = flat.to_toc()
+        self.assertEqual([t.as_dict() for t in self.toc], [t.as_dict() for t in toc])
+        self.assertEqual([t.qualified_id for t in descend_toc_pre_order(self.toc)],
+                         [t.qualified_id for t in descend_toc_pre_order(toc)])
+        self.assertTrue(all(t.element is None for t in descend_toc_pre_order(toc)))
+
+    def test_detach(self):
+        part = self.toc[0]
+        self.assertIs(part, part.detach())
+        self.assertTrue(all(t.element is None for t in descend_toc_pre_order([part])))
+        self.assertIs(self.element, self.toc[1].element)
+
+    def test_copy(self):
+        part = self.toc[0]
+        for copied in [copy(part), deepcopy(part)]:
+            self.assertEqual(part.as_dict(), copied.as_dict())
+            self.assertEqual(part.qualified_id, copied.qualified_id)
+        self.assertIs(part.children, copy(part).children)
+
+    def test_beautiful_element(self):
+        beautiful = BeautifulElement(self.toc[0])
+        self.assertEqual(('part_1', 'part', False, '1', 'part 1'),
+                         (beautiful.id, beautiful.type, beautiful.basic_unit, beautiful.num, beautiful.title))
+        self.assertEqual(('main', 'part/1', 'part_1', self.element),
+                         (beautiful.component, beautiful.subcomponent, beautiful.qualified_id, beautiful.element))
+        self.assertEqual(['1', '2'], [c.num for c in beautiful.children])
+        self.assertTrue(beautiful.children[0].basic_unit)
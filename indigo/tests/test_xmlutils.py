@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 from lxml import etree
 
 from indigo.analysis.differ import unwrap_element
+from indigo.xmlutils import XSLTCache
 
 
 class XMLUtilsTestCase(TestCase):
@@ -40,3 +44,47 @@ class XMLUtilsTestCase(TestCase):
             actual,
         )
 
+
+class XSLTCacheTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.xsl')
+        self.write_xsl('one')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_xsl(self, text, mtime=None):
+        with open(self.fname, 'w') as f:
+            f.write(f'''<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:output method="text"/>
+  <xsl:template match="/">{text}</xsl:template>
+</xsl:stylesheet>''')
+        if mtime:
+            os.utime(self.fname, (mtime, mtime))
+
+    def test_cache_hits(self):
+        cache = XSLTCache()
+        xslt = cache.get(self.fname)
+        self.assertIs(xslt, cache.get(self.fname))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1}, cache.stats())
+        self.assertEqual('one', str(xslt(etree.fromstring('<x/>'))))
+
+    def test_cache_recompiles_changed_file(self):
+        cache = XSLTCache()
+        cache.get(self.fname)
+        self.write_xsl('two', mtime=os.stat(self.fname).st_mtime + 10)
+
+        xslt = cache.get(self.fname)
+        self.assertEqual('two', str(xslt(etree.fromstring('<x/>'))))
+        self.assertEqual({'hits': 0, 'misses': 2, 'size': 1}, cache.stats())
+
+    def test_cache_evicts_lru(self):
+        cache = XSLTCache(maxsize=1)
+        other = os.path.join(self.tmpdir.name, 'other.xsl')
+        shutil.copy(self.fname, other)
+
+        cache.get(self.fname)
+        cache.get(other)
+        cache.get(self.fname)
+        self.assertEqual({'hits': 0, 'misses': 3, 'size': 1}, cache.stats())
@@ -1,7 +1,11 @@
+import os
 import re
+import threading
+from collections import OrderedDict
 from itertools import chain
 
 import lxml.html
+from lxml import etree
 
 
 def fragments_fromstring(html):
@@ -137,3 +141,70 @@ def merge_adjacent(e, nxt):
     for kid in nxt.iterchildren():
         e.append(kid)
     nxt.getparent().remove(nxt)
+
+
+class XSLTCache:
+    """ A thread-safe, size-bounded cache of compiled XSLT stylesheets.
+
+    Stylesheets are keyed by their resolved filename and modification time, so that
+    editing an XSL file on disk causes it to be recompiled. The least recently used
+    stylesheet is discarded when the cache is full.
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.stylesheets = OrderedDict()
+
+    def get(self, filename):
+        """ Return a compiled lxml.etree.XSLT object for the given filename.
+        """
+        filename = os.path.realpath(filename)
+        key = (filename, os.stat(filename).st_mtime_ns)
+
+        with self.lock:
+            xslt = self.stylesheets.get(key)
+            if xslt is not None:
+                self.stylesheets.move_to_end(key)
+                self.hits += 1
+                return xslt
+            self.misses += 1
+
+        # compile outside of the lock; at worst, two threads compile the same file
+        xslt = etree.XSLT(etree.parse(filename))
+
+        with self.lock:
+            # discard stale versions of this file
+            for stale in [k for k in self.stylesheets if k[0] == filename and k != key]:
+                del self.stylesheets[stale]
+            self.stylesheets[key] = xslt
+            self.stylesheets.move_to_end(key)
+            while len(self.stylesheets) > self.maxsize:
+                self.stylesheets.popitem(last=False)
+
+        return xslt
+
+    def stats(self):
+        """ Hit and miss counters, and the current number of cached stylesheets.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.stylesheets),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.stylesheets.clear()
+            self.hits = self.misses = 0
+
+
+xslt_cache = XSLTCache()
+
+
+def load_xslt(filename):
+    """ Load a compiled XSLT stylesheet from the process-wide cache.
+    """
+    return xslt_cache.get(filename)
@@ -0,0 +1,126 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from reversion import revisions as reversion
+
+from indigo.analysis.runner import AnalysisRunner
+from indigo_api.models import Document
+
+log = logging.getLogger(__name__)
+
+
+ANALYSIS_STEPS = {
+    'terms': AnalysisRunner.link_terms,
+    'references': AnalysisRunner.find_references,
+    'italics': AnalysisRunner.mark_up_italics,
+}
+""" Analysis steps that can be run in bulk, in the order in which they're run.
+"""
+
+
+def analyse_document(document_id, steps):
+    """ Run the analysis steps over a document, without saving it.
+
+    Returns a `(document_id, updated_at, content)` tuple, where content is None if the document didn't change
+    (or doesn't exist anymore).
+    """
+    document = Document.objects.undeleted().filter(pk=document_id).first()
+    if not document:
+        return document_id, None, None
+
+    original = document.document_xml
+    runner = AnalysisRunner(document)
+    for step in ANALYSIS_STEPS:
+        if step in steps:
+            ANALYSIS_STEPS[step](runner)
+    runner.finish()
+
+    content = document.document_xml
+    return document_id, document.updated_at, content if content != original else None
+
+
+class BulkAnalyser:
+    """ Runs analysis (such as linking terms and references) over many documents, such as all the acts in a place.
+
+    Documents are analysed in order of id, in batches. The documents in a batch are analysed in parallel by a
+    pool of worker processes, and then the changed documents are saved in a single transaction, with a single
+    revision. The id of the last document in each batch is logged, and analysis can be resumed after it by
+    passing it as `after_id`.
+
+    Documents that are changed by someone else while being analysed are skipped.
+    """
+    batch_size = 50
+
+    def __init__(self, steps, processes=None, comment=None):
+        self.steps = [s for s in ANALYSIS_STEPS if s in steps]
+        self.processes = processes or settings.INDIGO.get('BULK_ANALYSIS_PROCESSES')
+        self.comment = comment or f"Bulk analysis: {', '.join(self.steps)}"
+        self.analysed = 0
+        self.changed = 0
+
+    def documents(self, country, locality=None, doctype=None):
+        """ The documents to analyse in a place, optionally only those of a particular doctype.
+        """
+        documents = Document.objects.undeleted().filter(work__country=country)
+        if locality:
+            documents = documents.filter(work__locality=locality)
+        if doctype:
+            documents = documents.filter(work__frbr_uri__regex=f'^/akn/[^/]+/{doctype}/')
+        return documents.order_by('pk')
+
+    def document_ids(self, documents, after_id=None):
+        if after_id:
+            documents = documents.filter(pk__gt=after_id)
+        return list(documents.values_list('pk', flat=True))
+
+    def batches(self, ids):
+        for i in range(0, len(ids), self.batch_size):
+            yield ids[i:i + self.batch_size]
+
+    def analyse(self, documents, after_id=None, limit=None):
+        """ Analyse these documents (a queryset), starting after the document with id `after_id`, if given,
+        and stopping after `limit` documents, if given.
+
+        Returns the id of the last document analysed.
+        """
+        ids = self.document_ids(documents, after_id)[:limit]
+        log.info(f"Analysing {len(ids)} documents ({', '.join(self.steps)})")
+
+        # worker processes are forked so that they inherit the django setup and cached plugins
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('fork')) as executor:
+            for batch in self.batches(ids):
+                after_id = self.analyse_batch(executor, batch)
+                log.info(f"Analysed {self.analysed} of {len(ids)} documents, {self.changed} changed. "
+                         f"To resume, start after document {after_id}.")
+
+        return after_id
+
+    def analyse_batch(self, executor, ids):
+        """ Analyse a batch of documents and save the changed ones. Returns the id of the last document in the batch.
+        """
+        # worker processes (which may be forked when tasks are submitted) must not share our database connections
+        connections.close_all()
+        results = executor.map(analyse_document, ids, [self.steps] * len(ids))
+        self.save_batch([r for r in results if r[2] is not None])
+        self.analysed += len(ids)
+        return ids[-1]
+
+    def save_batch(self, results):
+        if not results:
+            return
+
+        with transaction.atomic(), reversion.create_revision():
+            reversion.set_comment(self.comment)
+            documents = Document.objects.select_for_update().in_bulk([document_id for document_id, _, _ in results])
+
+            for document_id, updated_at, content in results:
+                document = documents.get(document_id)
+                if not document or document.updated_at != updated_at:
+                    log.warning(f"Document {document_id} changed while it was being analysed, skipping it")
+                    continue
+                document.content = content
+                document.save()
+                self.changed += 1
@@ -0,0 +1,103 @@
+import hashlib
+
+from django.core.cache import cache
+
+
+class CapNumberIndex:
+    """ An index from cap (chapter) numbers to work FRBR URIs for each place, shared across requests.
+
+    Cap numbers are stored in place-specific work properties whose names start with `cap`, as configured in
+    INDIGO['WORK_PROPERTIES']. The index for a place is built with a single query the first time it's needed,
+    stored in the cache, and then kept up to date as works are saved and deleted.
+
+    The cached value for a place is a dict from work id to a `(frbr_uri, {property: cap_number})` tuple, for
+    works that have cap numbers.
+    """
+    prefix = 'cap-numbers'
+    # re-build the index at least daily, in case concurrent updates have been lost
+    timeout = 60 * 60 * 24
+
+    def cap_properties(self, place):
+        return [p for p in place.settings.work_properties if p.startswith('cap')]
+
+    def cache_key(self, country_id, locality_id, cap_properties):
+        # the work properties are part of the key, so that changing them uses a new index
+        digest = hashlib.sha256(repr(sorted(cap_properties)).encode('utf-8')).hexdigest()
+        return f'{self.prefix}:{country_id}:{locality_id or "-"}:{digest}'
+
+    def for_place(self, country, locality):
+        """ A dict from cap number to FRBR URI for works in this place.
+        """
+        cap_properties = self.cap_properties(locality or country)
+        if not cap_properties:
+            return {}
+
+        key = self.cache_key(country.pk, locality.pk if locality else None, cap_properties)
+        entries = cache.get(key)
+        if entries is None:
+            entries = self.build(country, locality, cap_properties)
+            cache.set(key, entries, timeout=self.timeout)
+
+        # later properties take precedence over earlier ones
+        return {
+            caps[p]: frbr_uri
+            for p in cap_properties
+            for frbr_uri, caps in entries.values()
+            if caps.get(p)
+        }
+
+    def build(self, country, locality, cap_properties):
+        from indigo_api.models import Work
+
+        entries = {}
+        works = Work.objects.filter(country=country, locality=locality).values_list('pk', 'frbr_uri', 'properties')
+        for pk, frbr_uri, properties in works:
+            entry = self.make_entry(frbr_uri, properties, cap_properties)
+            if entry:
+                entries[pk] = entry
+        return entries
+
+    def make_entry(self, frbr_uri, properties, cap_properties):
+        caps = {p: properties[p] for p in cap_properties if (properties or {}).get(p)}
+        if caps:
+            return frbr_uri, caps
+
+    def update(self, work, country_id, locality_id, deleted=False):
+        """ Update the cached index for a place, if it exists, to reflect changes to this work.
+        """
+        if (work.country_id, work.locality_id) == (country_id, locality_id):
+            place = work.place
+        else:
+            from indigo_api.models import Country, Locality
+            place = Locality.objects.get(pk=locality_id) if locality_id else Country.objects.get(pk=country_id)
+
+        cap_properties = self.cap_properties(place)
+        if not cap_properties:
+            return
+
+        key = self.cache_key(country_id, locality_id, cap_properties)
+        entries = cache.get(key)
+        if entries is None:
+            return
+
+        entry = None if deleted else self.make_entry(work.frbr_uri, work.properties, cap_properties)
+        if entry:
+            entries[work.pk] = entry
+        else:
+            entries.pop(work.pk, None)
+        cache.set(key, entries, timeout=self.timeout)
+
+    def work_saved(self, work):
+        loaded_place = getattr(work, '_loaded_place', None)
+        place = (work.country_id, work.locality_id)
+        if loaded_place and loaded_place != place:
+            # the work has moved, remove it from the old place
+            self.update(work, *loaded_place, deleted=True)
+        self.update(work, *place)
+        work._loaded_place = place
+
+    def work_deleted(self, work):
+        self.update(work, work.country_id, work.locality_id, deleted=True)
+
+
+cap_number_index = CapNumberIndex()
@@ -90,8 +90,9 @@ class CorrectAttachmentEids(DataMigration):
     """ Ensure that attachment eIds are correctly prefixed
     """
     def migrate_document(self, document):
-        self.ns = document.doc.namespace
-        changed, _ = self.migrate_xml(document.doc.root)
+        doc = document.writable_doc
+        self.ns = doc.namespace
+        changed, _ = self.migrate_xml(doc.root)
         return changed
 
     def migrate_xml(self, xml):
@@ -1,3 +1,4 @@
+import copy
 import os
 import re
 import shutil
@@ -5,11 +6,15 @@ import tempfile
 import urllib.parse
 import logging
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import lxml.html
 from django.conf import settings
 from django.contrib.staticfiles.finders import find as find_static
+from django.core.cache import caches
+from django.db import connections
 from django.template.loader import render_to_string, get_template
+from django.utils import translation
 from ebooklib import epub
 from languages_plus.models import Language
 from lxml import etree as ET
@@ -17,7 +22,10 @@ from sass_processor.processor import SassProcessor
 from wkhtmltopdf import make_absolute_paths, wkhtmltopdf
 
 from indigo.plugins import plugins, LocaleBasedMatcher
+from indigo.xmlutils import load_xslt
+from indigo_api.importers.pdfs import pdf_count_pages, pdf_unite
 from indigo_api.models import Colophon
+from indigo_api.render_cache import document_renditions, rendered_html_cache
 from indigo_api.utils import filename_candidates, find_best_template, find_best_static
 
 
@@ -55,7 +63,7 @@ class HTMLExporter:
         else:
             # the entire document
             if document.document_xml:
-                content_html = renderer.render_xml(document.document_xml)
+                content_html = rendered_html_cache.render(document, renderer)
             else:
                 content_html = ''
 
@@ -79,6 +87,15 @@ class HTMLExporter:
         else:
             return render_to_string(template_name, context)
 
+    def cached_element_html(self, document, component, subcomponent):
+        """ Return pre-rendered HTML for an element of this document, such as `section/5`, or None.
+
+        This doesn't parse the document, and only applies to non-standalone renders.
+        """
+        if self.standalone:
+            return None
+        return rendered_html_cache.get_element_html(document, self._xml_renderer(document), component, subcomponent)
+
     def coverpage_template(self, document):
         return self.find_template(document, prefix='coverpage_')
 
@@ -143,10 +160,17 @@ class PDFExporter(HTMLExporter, LocaleBasedMatcher):
     """
     locale = (None, None, None)
 
+    outline_ns = 'http://wkhtmltopdf.org/outline'
+
     def __init__(self, toc=True, colophon=True, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.toc = toc
         self.colophon = colophon
+        # render many documents in parallel, and join them together?
+        self.parallel = settings.INDIGO.get('PDF_PARALLEL_RENDER_MANY', False)
+        self.max_workers = settings.INDIGO.get('PDF_PARALLEL_RENDER_MANY_WORKERS')
+        # filename to dump the wkhtmltopdf outline XML into, if any
+        self.dump_outline = None
 
     def render(self, document, element=None):
         self.media_url = 'doc-0/'
@@ -162,6 +186,9 @@ class PDFExporter(HTMLExporter, LocaleBasedMatcher):
             return self.to_pdf(html, tmpdir, document=document)
 
     def render_many(self, documents, **kwargs):
+        if self.parallel and len(documents) > 1:
+            return self.render_many_parallel(documents)
+
         html = []
 
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -180,6 +207,151 @@ class PDFExporter(HTMLExporter, LocaleBasedMatcher):
 
             return self.to_pdf(html, tmpdir, documents=documents)
 
+    def render_many_parallel(self, documents):
+        """ Render many documents into a single PDF, by rendering each document into its own PDF in parallel
+        and then joining them together with pdfunite.
+
+        The colophon and table of contents are rendered separately. The table of contents is built by
+        combining the outlines of each document's PDF, adjusting the page numbers to match the joined PDF.
+
+        Unlike `render_many`, the page numbers in the footers start at 1 for each document, because each
+        document is rendered before the number of pages before it is known. The page numbers in the table of
+        contents are those of the joined PDF.
+        """
+        self.document = documents[0]
+        language = translation.get_language()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            def render_part(i):
+                try:
+                    with translation.override(language):
+                        return self.render_part(documents[i], os.path.join(tmpdir, f'part-{i}'))
+                finally:
+                    # each thread has its own database connection
+                    connections.close_all()
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                parts = list(executor.map(render_part, range(len(documents))))
+
+            fnames = []
+            if self.colophon:
+                colophon = self.render_colophon(documents=documents)
+                if colophon:
+                    fnames.append(self.html_to_pdf_file(colophon, tmpdir, 'colophon', header_footer=False))
+
+            if self.toc:
+                offset = sum(pdf_count_pages(f) for f in fnames)
+                fnames.append(self.render_combined_toc(parts, offset, tmpdir))
+
+            fnames.extend(fname for fname, outline in parts)
+
+            fname = os.path.join(tmpdir, 'combined.pdf')
+            pdf_unite(fnames, fname)
+            with open(fname, 'rb') as f:
+                return f.read()
+
+    def render_part(self, document, fname):
+        """ Render a single document, without a colophon or table of contents, as one part of
+        a multi-document PDF. Parts are cached.
+
+        Returns a tuple of (PDF filename, outline XML).
+        """
+        cache = caches['default']
+        key = self.part_cache_key(document)
+        part = cache.get(key) if key else None
+
+        if not part:
+            exporter = copy.copy(self)
+            exporter.toc = False
+            exporter.colophon = False
+            exporter.parallel = False
+            exporter.dump_outline = fname + '.xml'
+            pdf = exporter.render(document)
+            with open(exporter.dump_outline, 'rb') as f:
+                outline = f.read()
+            part = (pdf, outline)
+            if key:
+                cache.set(key, part)
+
+        pdf, outline = part
+        fname = fname + '.pdf'
+        with open(fname, 'wb') as f:
+            f.write(pdf)
+
+        return fname, outline
+
+    def part_cache_key(self, document):
+        """ The cache key for a part rendered by `render_part`, or None if it must not be cached.
+
+        Parts also depend on the exporter (which may be a plugin for a particular locale), the
+        language they are rendered in, and the work-level details shown on the coverpage (see
+        `DocumentRenditions.fingerprint`).
+        """
+        if document.id:
+            exporter = f'{type(self).__module__}.{type(self).__qualname__}'
+            return f'pdf-part:{exporter}:{translation.get_language()}:{document.id}:' \
+                   f'{document_renditions.fingerprint(document)}:{self.resolver}'
+
+    def render_combined_toc(self, parts, offset, tmpdir):
+        """ Render a table of contents for the parts, which will be preceded by offset pages,
+        and return the filename of the rendered PDF.
+        """
+        xslt = load_xslt(self.toc_xsl())
+        outlines = [ET.fromstring(outline) for fname, outline in parts]
+        page_counts = [pdf_count_pages(fname) for fname, outline in parts]
+
+        # adding the TOC changes the page numbers of the parts, which can change the length of the TOC,
+        # so re-render until the length is stable
+        toc_pages = 1
+        for attempt in range(3):
+            combined = self.combine_outlines(outlines, page_counts, offset + toc_pages)
+            fname = self.html_to_pdf_file(str(xslt(combined)), tmpdir, f'toc-{attempt}')
+            n_pages = pdf_count_pages(fname)
+            if n_pages == toc_pages:
+                break
+            toc_pages = n_pages
+
+        return fname
+
+    def combine_outlines(self, outlines, page_counts, offset):
+        """ Combine wkhtmltopdf outlines for consecutive PDFs into a single outline, with page numbers
+        adjusted so that the first PDF starts after offset pages. Internal links are dropped, since
+        they don't survive joining the PDFs.
+        """
+        ns = self.outline_ns
+        combined = ET.Element(f'{{{ns}}}outline', nsmap={None: ns})
+        root = ET.SubElement(combined, f'{{{ns}}}item', title='', page='0', link='', backLink='')
+
+        for outline, page_count in zip(outlines, page_counts):
+            for item in outline.iterfind(f'{{{ns}}}item/{{{ns}}}item'):
+                item = copy.deepcopy(item)
+                for entry in item.iter(f'{{{ns}}}item'):
+                    entry.set('page', str(int(entry.get('page', '1')) + offset))
+                    entry.attrib.pop('link', None)
+                    entry.attrib.pop('backLink', None)
+                root.append(item)
+            offset += page_count
+
+        return combined
+
+    def html_to_pdf_file(self, html, tmpdir, name, header_footer=True):
+        """ Render a standalone HTML document into a PDF in tmpdir, and return the PDF filename.
+        """
+        options = self.pdf_options()
+        options.pop('xsl-style-sheet')
+        if not header_footer:
+            options = {k: v for k, v in options.items() if not k.startswith(('header-', 'footer-'))}
+
+        with tempfile.NamedTemporaryFile(suffix='.html', dir=tmpdir) as f:
+            f.write(make_absolute_paths(html).encode('utf-8'))
+            f.flush()
+            pdf = self._wkhtmltopdf(['file://' + f.name], **options)
+
+        fname = os.path.join(tmpdir, f'{name}.pdf')
+        with open(fname, 'wb') as f:
+            f.write(pdf)
+        return fname
+
     def save_attachments(self, html, document, prefix, tmpdir):
         """ Place attachments needed by the html of this document into tmpdir. Only attachments
         referenced using the given prefix are saved.
@@ -241,6 +413,9 @@ class PDFExporter(HTMLExporter, LocaleBasedMatcher):
         if self.toc:
             args.extend(['toc', '--xsl-style-sheet', toc_xsl])
 
+        if self.dump_outline:
+            options['dump-outline'] = self.dump_outline
+
         with tempfile.NamedTemporaryFile(suffix='.html', dir=dirname) as f:
             f.write(html.encode('utf-8'))
             f.flush()
@@ -346,6 +521,12 @@ class PDFExporter(HTMLExporter, LocaleBasedMatcher):
         return get_template(best).origin.name
 
 
+def get_pdf_exporter():
+    """ The PDF exporter used to render PDFs, both on demand and ahead of time.
+    """
+    return plugins.for_locale('pdf-exporter')
+
+
 class EPUBExporter(HTMLExporter):
     """ Helper to render documents as ePubs.
 
@@ -587,7 +768,8 @@ class XSLTRenderer(object):
     """
 
     def __init__(self, xslt_filename, xslt_params=None):
-        self.xslt = ET.XSLT(ET.parse(xslt_filename))
+        self.xslt_filename = xslt_filename
+        self.xslt = load_xslt(xslt_filename)
         self.xslt_params = xslt_params or {}
 
     def render(self, node):
@@ -4,6 +4,7 @@ import logging
 import re
 
 from django.core.files.uploadedfile import UploadedFile
+from indigo.analysis.runner import AnalysisRunner
 from indigo.plugins import plugins, LocaleBasedMatcher
 from indigo.pipelines.pipeline import Pipeline, PipelineContext
 import indigo.pipelines.xml as xml
@@ -199,30 +200,10 @@ class Importer(LocaleBasedMatcher):
     def analyse_after_import(self, doc):
         """ Run analysis after first import.
         """
-        finder = plugins.for_document('refs', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-subtypes', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-cap', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-act-names', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('internal-refs', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        italics_terms_finder = plugins.for_document('italics-terms', doc)
-        italics_terms = doc.work.country.italics_terms
-        if italics_terms_finder and italics_terms:
-            italics_terms_finder.mark_up_italics_in_document(doc, italics_terms)
+        runner = AnalysisRunner(doc)
+        runner.find_references()
+        runner.mark_up_italics()
+        runner.finish()
 
     def import_from_pdf(self, upload, doc):
         context = ImportContext(pipeline=self.pdf_pipeline)
@@ -72,7 +72,13 @@ def pdf_extract_pages(src_fname, pages, tgt_fname):
         page_nums = sorted(list(set(page_nums)))
 
         # join them back together
-        args = ["pdfunite"]
-        args.extend([os.path.join(tmpdir, f'page-{i}.pdf') for i in page_nums])
-        args.append(tgt_fname)
-        subprocess.run(args, check=True)
+        pdf_unite([os.path.join(tmpdir, f'page-{i}.pdf') for i in page_nums], tgt_fname)
+
+
+def pdf_unite(src_fnames, tgt_fname):
+    """ Combine the pdfs named in src_fnames, in order, into tgt_fname.
+    """
+    args = ["pdfunite"]
+    args.extend(src_fnames)
+    args.append(tgt_fname)
+    subprocess.run(args, check=True)
@@ -0,0 +1,42 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from indigo_api.bulk_analysis import ANALYSIS_STEPS, BulkAnalyser
+from indigo_api.models import Country, Locality
+from indigo_api.tasks import analyse_documents
+
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run analysis, such as linking terms and references, over all the documents in a country (or locality). ' \
+           'Example: `python manage.py analyse_documents za-cpt --doctype act --steps terms references`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('place', type=str, help="A place code, e.g. 'za' for South Africa or 'za-cpt' for Cape Town")
+        parser.add_argument('--doctype', type=str, help="Only analyse documents of this doctype, e.g. 'act'")
+        parser.add_argument('--steps', nargs='+', choices=list(ANALYSIS_STEPS.keys()), default=list(ANALYSIS_STEPS.keys()),
+                            help='The analysis steps to run (default: all of them)')
+        parser.add_argument('--processes', type=int, help='Number of processes to use (default: number of CPUs)')
+        parser.add_argument('--after-id', type=int,
+                            help='Resume analysis after the document with this id, as logged by a previous run')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue a background task rather than analysing immediately')
+
+    def handle(self, *args, **options):
+        try:
+            country, locality = Country.get_country_locality(options['place'])
+        except (Country.DoesNotExist, Locality.DoesNotExist):
+            raise CommandError(f"Place not found: {options['place']}")
+
+        if options['background']:
+            analyse_documents(options['place'], options['doctype'], options['steps'], options['after_id'])
+            log.info(f"Queued analysis of documents for {options['place']}")
+            return
+
+        analyser = BulkAnalyser(options['steps'], processes=options['processes'])
+        documents = analyser.documents(country, locality, options['doctype'])
+        analyser.analyse(documents, options['after_id'])
+        log.info(f"Analysed {analyser.analysed} documents for {options['place']}, {analyser.changed} changed")
@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from indigo.analysis.toc.base import TOCBuilderBase, TOCElement, descend_toc_pre_order
+
+
+class Command(BaseCommand):
+    help = 'Benchmark building up the commenceable provisions of a large synthetic act with many points in time. ' \
+           'Example: `python manage.py benchmark_provisions --sections 2000 --points-in-time 30`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', type=int, default=2000, help='Number of sections in the act')
+        parser.add_argument('--subsections', type=int, default=3, help='Number of subsections in each section')
+        parser.add_argument('--points-in-time', type=int, default=30, help='Number of points in time')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        tocs = self.make_tocs(rnd, options['sections'], options['subsections'], options['points_in_time'])
+        plugin = TOCBuilderBase()
+
+        provisions = []
+        id_set = set()
+        start = time.perf_counter()
+        for toc in tocs:
+            provisions = list(provisions)
+            id_set = set(id_set)
+            plugin.insert_provisions(provisions, id_set, toc)
+        elapsed = time.perf_counter() - start
+
+        count = sum(1 for _ in descend_toc_pre_order(provisions))
+        self.stdout.write(f"Built {count} provisions from {len(tocs)} points in time in {elapsed:.3f}s "
+                          f"({elapsed / len(tocs) * 1000:.1f}ms per point in time)")
+
+    def make_tocs(self, rnd, n_sections, n_subsections, n_points):
+        """ Make a TOC for each point in time. Each point in time inserts some new sections (and subsections) and
+        removes some of the sections of the point in time before it.
+        """
+        nums = [str(n) for n in range(1, n_sections + 1)]
+        tocs = []
+        for point in range(n_points):
+            if point:
+                # remove some sections and insert others after existing ones
+                for _ in range(n_sections // 100):
+                    nums.pop(rnd.randrange(len(nums)))
+                for _ in range(n_sections // 50):
+                    i = rnd.randrange(len(nums))
+                    nums.insert(i + 1, f'{nums[i]}{chr(ord("A") + point % 26)}{point}')
+            tocs.append([self.make_section(num, n_subsections) for num in nums])
+        return tocs
+
+    def make_section(self, num, n_subsections):
+        return TOCElement(None, 'main', 'section', id_=f'sec_{num}', num=f'{num}.', basic_unit=True, children=[
+            TOCElement(None, 'main', 'subsection', id_=f'sec_{num}__subsec_{n}', num=f'({n})')
+            for n in range(1, n_subsections + 1)
+        ])
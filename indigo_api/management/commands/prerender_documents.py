@@ -0,0 +1,39 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from indigo_api.models import Country, Document, Locality
+from indigo_api.tasks import prerender_document
+
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the HTML, PDF and ePUB of all published documents in a country (or locality). ' \
+           'Example: `python manage.py prerender_documents za-cpt`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('place', type=str, help="A place code, e.g. 'za' for South Africa or 'za-cpt' for Cape Town")
+        parser.add_argument('--background', action='store_true',
+                            help='Queue background tasks rather than rendering immediately')
+
+    def handle(self, *args, **options):
+        try:
+            country, locality = Country.get_country_locality(options['place'])
+        except (Country.DoesNotExist, Locality.DoesNotExist):
+            raise CommandError(f"Place not found: {options['place']}")
+
+        documents = Document.objects.undeleted().published().filter(work__country=country)
+        if locality:
+            documents = documents.filter(work__locality=locality)
+
+        ids = list(documents.order_by('pk').values_list('pk', flat=True))
+        log.info(f"Pre-rendering {len(ids)} documents for {options['place']}")
+
+        for i, document_id in enumerate(ids):
+            if options['background']:
+                prerender_document(document_id)
+            else:
+                log.info(f"Rendering document {document_id} ({i + 1} of {len(ids)})")
+                prerender_document.now(document_id)
@@ -0,0 +1,42 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from indigo_api.models import Country, Document, Locality
+
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored table of contents of all documents, or those in a country (or locality). ' \
+           'This is necessary when the way tables of contents are built changes, such as when a TOC plugin, ' \
+           'or the translations of its titles, are updated. ' \
+           'Example: `python manage.py rebuild_toc_json za-cpt`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('place', type=str, nargs='?',
+                            help="A place code, e.g. 'za' for South Africa or 'za-cpt' for Cape Town")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.undeleted()
+
+        if options['place']:
+            try:
+                country, locality = Country.get_country_locality(options['place'])
+            except (Country.DoesNotExist, Locality.DoesNotExist):
+                raise CommandError(f"Place not found: {options['place']}")
+
+            documents = documents.filter(work__country=country)
+            if locality:
+                documents = documents.filter(work__locality=locality)
+
+        ids = list(documents.order_by('pk').values_list('pk', flat=True))
+        log.info(f"Rebuilding the table of contents of {len(ids)} documents")
+
+        for i, document_id in enumerate(ids):
+            log.info(f"Rebuilding document {document_id} ({i + 1} of {len(ids)})")
+            document = Document.objects.get(pk=document_id)
+            document.refresh_toc_json()
+            # don't change anything else about the document
+            Document.objects.filter(pk=document_id).update(toc_json=document.toc_json)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0014_remove_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='xml_sync_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
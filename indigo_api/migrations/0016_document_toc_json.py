@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0015_document_xml_sync_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='toc_json',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,13 +1,17 @@
 import os
+import copy
+import hashlib
 import logging
 import datetime
+import json
 
 from actstream import action
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import signals
 from django.core.management import call_command
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.db.models import JSONField
 from django.dispatch import receiver
 from django.urls import reverse
@@ -19,9 +23,11 @@ import reversion.revisions
 from reversion.models import Version
 from cobalt import FrbrUri, AmendmentEvent, datestring, StructuredDocument
 
-from indigo.analysis.toc.base import descend_toc_pre_order
+from indigo.analysis.toc.base import descend_toc_pre_order, descend_toc_json_pre_order, FlatTOC
 from indigo.plugins import plugins
-from indigo.documents import ResolvedAnchor
+from indigo.documents import ResolvedAnchor, DocumentIndex
+from indigo_api.parse_cache import parsed_document_cache
+from indigo_api.signals import document_published
 
 log = logging.getLogger(__name__)
 
@@ -42,7 +48,7 @@ class DocumentQuerySet(models.QuerySet):
         return self.filter(draft=False)
 
     def no_xml(self):
-        return self.defer('document_xml')
+        return self.defer('document_xml', 'toc_json')
 
     def latest_expression(self):
         """ Select only the most recent expression for documents with the same frbr_uri.
@@ -149,17 +155,26 @@ class DocumentMixin(object):
         """ Get the named subcomponent in this document, such as `chapter/2` or 'section/13A'.
         :class:`lxml.objectify.ObjectifiedElement` or `None`.
         """
-        def search_toc(items):
-            for item in items:
-                if item.component == component and item.subcomponent == subcomponent:
-                    return item.element
-
-                if item.children:
-                    found = search_toc(item.children)
-                    if found:
-                        return found
-
-        return search_toc(self.table_of_contents())
+        # use the stored table of contents to go straight to the element by its eId, if possible
+        toc_json = getattr(self, 'toc_json', None)
+        if toc_json:
+            for item in descend_toc_json_pre_order(toc_json):
+                if item['component'] == component and item.get('subcomponent') == subcomponent:
+                    if item.get('id'):
+                        element = self.element_index().element_by_eid(component, item['id'])
+                        if element is not None:
+                            return element
+                    break
+
+        return self.element_index().subcomponent(component, subcomponent)
+
+    def element_index(self):
+        """ The :class:`indigo.documents.DocumentIndex` for this document, built once for each parsed document.
+        """
+        index = getattr(self, '_element_index', None)
+        if index is None or index.doc is not self.doc:
+            self._element_index = index = DocumentIndex(self)
+        return index
 
     def table_of_contents(self):
         if not hasattr(self, '_toc'):
@@ -167,6 +182,38 @@ class DocumentMixin(object):
             self._toc = builder.table_of_contents_for_document(self)
         return self._toc
 
+    def table_of_contents_json(self):
+        """ The table of contents as a list of dicts, suitable for serialising as JSON.
+        This uses the stored table of contents, if available, which doesn't require parsing the document.
+        """
+        toc_json = getattr(self, 'toc_json', None)
+        if toc_json is not None:
+            # callers may decorate the entries, so don't hand out the stored copy
+            return copy.deepcopy(toc_json)
+        return [t.as_dict() for t in self.flat_table_of_contents().to_toc()]
+
+    def table_of_contents_json_text(self):
+        """ The table of contents as a JSON string. This is equivalent to encoding `table_of_contents_json()`, but
+        doesn't copy the stored table of contents, or build intermediate dicts if there isn't one.
+        """
+        toc_json = getattr(self, 'toc_json', None)
+        if toc_json is not None:
+            return json.dumps(toc_json, ensure_ascii=False, separators=(',', ':'))
+        return self.flat_table_of_contents().as_json()
+
+    def flat_table_of_contents(self):
+        """ The table of contents as a :class:`indigo.analysis.toc.base.FlatTOC`, which doesn't refer to the XML.
+
+        For documents whose parsed XML is shared (see `doc`), this is kept with the parsed XML, so that documents
+        without a stored table of contents don't have to rebuild it for each request. It must not be changed.
+        """
+        def build():
+            return FlatTOC.from_toc(self.table_of_contents())
+
+        if self.doc is not None and self._doc_shared:
+            return parsed_document_cache.toc(self, self.cobalt_class, build)
+        return build()
+
     def all_provisions(self):
         ids = []
 
@@ -349,14 +396,51 @@ class Document(DocumentMixin, models.Model):
     created_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
     updated_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
 
+    toc_json = JSONField(null=True, blank=True, editable=False)
+    """ The table of contents, as built by table_of_contents_json(), stored when the document is saved """
+
+    xml_sync_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    """ Hash of the model and work attributes last copied into the XML, see xml_sync_fingerprint() """
+
     # caching attributes
     _expression_uri = None
+    _loaded_document_xml = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the XML we loaded, so that we can tell if it has changed
+        instance._loaded_document_xml = instance.__dict__.get('document_xml')
+        return instance
 
     @property
     def doc(self):
-        """ The wrapped `an.act.Act` that this document works with. """
+        """ The wrapped `an.act.Act` that this document works with.
+
+        For documents loaded from the database, this is shared with other users of the same document
+        (see `parsed_document_cache`), and must not be changed. Use `writable_doc` to change it.
+        """
         if not getattr(self, '_doc', None):
+            # only share the XML as it is in the database
+            if self.pk and self.updated_at and self.document_xml and self.document_xml == self._loaded_document_xml:
+                self._doc = parsed_document_cache.get(self, self.cobalt_class)
+                self._doc_shared = True
+            else:
+                self._doc = self._make_doc(self.document_xml)
+                self._doc_shared = False
+        return self._doc
+
+    @property
+    def writable_doc(self):
+        """ As for `doc`, but this document's own copy, which can be changed.
+        """
+        if getattr(self, '_doc', None) is None or self._doc_shared:
+            # re-parsing is as fast as copying the shared tree
             self._doc = self._make_doc(self.document_xml)
+            self._doc_shared = False
+            # the table of contents refers to elements of the old tree
+            if hasattr(self, '_toc'):
+                del self._toc
         return self._doc
 
     @property
@@ -427,9 +511,60 @@ class Document(DocumentMixin, models.Model):
         return self.work.publication_date
 
     def save(self, *args, **kwargs):
-        self.copy_attributes()
+        fingerprint = self.xml_sync_fingerprint()
+        if self.xml_needs_sync(fingerprint):
+            self.copy_attributes()
+            self.refresh_toc_json()
+        elif 'toc_json' not in self.get_deferred_fields() and self.toc_json is None:
+            self.refresh_toc_json()
+        self.xml_sync_hash = fingerprint
         return super(Document, self).save(*args, **kwargs)
 
+    def refresh_toc_json(self):
+        """ Rebuild the stored table of contents from the XML.
+        """
+        if hasattr(self, '_toc'):
+            del self._toc
+        self._element_index = None
+        self.toc_json = [t.as_dict() for t in self.table_of_contents()] if self.document_xml else None
+
+    def xml_sync_fingerprint(self):
+        """ A hash of the model and work attributes that copy_attributes() copies into the XML.
+        """
+        repeal = self.work.repeal
+        parts = [
+            self.work.frbr_uri,
+            self.title or self.work.title,
+            self.language.code,
+            self.expression_date,
+            self.publication_date,
+            self.publication_name,
+            self.publication_number,
+            (repeal.date, repeal.repealing_title, repeal.repealing_uri) if repeal else None,
+            [(a.date, a.amending_title, a.amending_uri) for a in self.amendment_events()],
+        ]
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def xml_needs_sync(self, fingerprint):
+        """ Does the XML need to be re-synced with the model and work attributes before saving?
+
+        This is only unnecessary if the XML hasn't been parsed (and so can't have been changed) or
+        changed since it was loaded, and none of the attributes that are copied into it have changed.
+        Metadata-only changes, such as publishing a document, can then skip parsing and
+        re-serialising the XML.
+
+        `updated_at` is deliberately not one of these attributes, so the manifestation date in the XML
+        isn't changed by metadata-only changes.
+        """
+        if getattr(self, '_doc', None) is not None and not self._doc_shared:
+            return True
+
+        if 'document_xml' not in self.get_deferred_fields() and (
+                self._loaded_document_xml is None or self.document_xml != self._loaded_document_xml):
+            return True
+
+        return fingerprint != self.xml_sync_hash
+
     def save_with_revision(self, user, comment=None):
         """ Save this document and create a new revision at the same time.
         """
@@ -447,16 +582,19 @@ class Document(DocumentMixin, models.Model):
         if from_model:
             self.copy_attributes_from_work()
 
-            self.doc.frbr_uri = self.frbr_uri
-            self.doc.title = self.title
-            self.doc.language = self.language.code
+            doc = self.writable_doc
+            doc.frbr_uri = self.frbr_uri
+            doc.title = self.title
+            doc.language = self.language.code
 
-            self.doc.expression_date = self.expression_date or self.publication_date or timezone.now()
-            self.doc.manifestation_date = self.updated_at or timezone.now()
-            self.doc.publication_number = self.publication_number
-            self.doc.publication_name = self.publication_name
-            self.doc.publication_date = self.publication_date
-            self.doc.repeal = self.work.repeal
+            doc.expression_date = self.expression_date or self.publication_date or timezone.now()
+            # this is only updated when the XML is synced (see xml_needs_sync), so it's the date the XML last
+            # changed, not the date the document was last saved
+            doc.manifestation_date = self.updated_at or timezone.now()
+            doc.publication_number = self.publication_number
+            doc.publication_name = self.publication_name
+            doc.publication_date = self.publication_date
+            doc.repeal = self.work.repeal
 
         else:
             self.title = self.doc.title
@@ -476,7 +614,7 @@ class Document(DocumentMixin, models.Model):
             setattr(self, attr, getattr(self.work, attr))
 
         # copy over amendments at or before this expression date
-        self.doc.amendments = self.amendment_events()
+        self.writable_doc.amendments = self.amendment_events()
 
         # copy over title if it's not set
         if not self.title:
@@ -484,6 +622,8 @@ class Document(DocumentMixin, models.Model):
 
     def refresh_xml(self):
         self.document_xml = self.doc.to_xml().decode('utf-8')
+        # the stored table of contents may no longer match; it's rebuilt when the document is saved
+        self.toc_json = None
 
     def reset_xml(self, xml, from_model=False):
         """ Completely reset the document XML to a new value. If from_model is False,
@@ -493,6 +633,10 @@ class Document(DocumentMixin, models.Model):
 
         # now update ourselves
         self._doc = doc
+        self._doc_shared = False
+        if hasattr(self, '_toc'):
+            del self._toc
+        self.toc_json = None
         self.copy_attributes(from_model)
 
     def versions(self):
@@ -590,6 +734,42 @@ def post_save_document(sender, instance, **kwargs):
         action.send(instance.updated_by_user, verb='updated', action_object=instance,
                     place_code=instance.work.place.place_code)
 
+    if settings.INDIGO.get('PRERENDER_DOCUMENTS') and not instance.draft and not instance.deleted:
+        schedule_prerender_document(instance)
+
+
+@receiver(document_published)
+def document_published_prerender(sender, document, **kwargs):
+    """ Pre-render the HTML, PDF and ePUB for newly published documents in the background, if enabled.
+
+    Pre-rendering a large document takes a long time, so it is never done during the request.
+    """
+    if settings.INDIGO.get('PRERENDER_DOCUMENTS'):
+        schedule_prerender_document(document)
+
+
+@receiver(reversion.revisions.post_revision_commit)
+def post_revision_commit_precompute_diffs(sender, revision, versions, **kwargs):
+    """ Queue background tasks to pre-compute the diffs for new versions of documents, once the current
+    transaction commits.
+    """
+    if settings.INDIGO.get('PRECOMPUTE_REVISION_DIFFS'):
+        from indigo_api.tasks import precompute_revision_diff
+
+        content_type = ContentType.objects.get_for_model(Document)
+        for version in versions:
+            if version.content_type_id == content_type.pk:
+                transaction.on_commit(lambda version_id=version.pk: precompute_revision_diff(version_id))
+
+
+def schedule_prerender_document(document):
+    """ Queue a background task to pre-render the document once the current transaction commits.
+    """
+    from indigo_api.tasks import prerender_document
+
+    document_id = document.pk
+    transaction.on_commit(lambda: prerender_document(document_id))
+
 
 def attachment_filename(instance, filename):
     """ Make S3 attachment filenames relative to the document,
@@ -1,6 +1,5 @@
 # coding=utf-8
 
-from copy import deepcopy
 from actstream import action
 from django.db.models import JSONField
 from django.db import models
@@ -14,6 +13,7 @@ from reversion.models import Version
 from cobalt import FrbrUri, RepealEvent
 
 from indigo.plugins import plugins
+from indigo_api.cap_numbers import cap_number_index
 
 
 class WorkQuerySet(models.QuerySet):
@@ -256,17 +256,29 @@ class WorkMixin(object):
         If `date` is provided, only provisions in expressions up to and including that date are included.
 
         This is a potentially expensive operation across multiple documents, and so intermediate and final
-        results are cached.
+        results are cached across requests. The returned provisions are shared and must not be changed.
         """
-        from indigo.analysis.toc.base import descend_toc_pre_order
+        from indigo_api.provisions_cache import commenceable_provisions_cache
+
+        documents = self.commenceable_provisions_documents(date)
+
+        # get a TOC plugin that can be shared across all these documents
+        locality = self.locality.code if self.locality else None
+        plugin = plugins.for_locale('toc', country=self.country.code, locality=locality, language=self.country.primary_language.code)
+        if not plugin:
+            return []
+
+        return commenceable_provisions_cache.provisions(plugin, documents, self.load_tocs_for_provisions)
 
-        if getattr(self, '_provision_cache', None) is None:
-            # cache the provisions for the various documents because they are expensive to compute
-            self._provision_cache = {}
+    def commenceable_provisions_documents(self, date=None):
+        """ Returns a list of dicts describing the expressions whose provisions make up the commenceable provisions
+        at `date` (if given), in the order in which they are layered.
+        """
+        if getattr(self, '_docs_for_provisions', None) is None:
             # cache selected details of the documents we use to build up provisions, in ascending expression date order
             self._docs_for_provisions = list(
                 self.expressions()
-                    .values('id', 'language_id', 'expression_date')
+                    .values('id', 'language_id', 'expression_date', 'updated_at')
                     .order_by('expression_date')
                     .all())
 
@@ -280,50 +292,25 @@ class WorkMixin(object):
             # use all expressions
             documents = self._docs_for_provisions
 
-        # ids of documents we need to generate TOCs for
-        to_load = [d['id'] for d in documents if d['id'] not in self._provision_cache]
-        tocs = {}
-        if to_load:
-            docs_for_toc = self.expressions().filter(pk__in=to_load) \
-                .select_related('language', 'language__language', 'work__locality', 'work__country', 'work__country__country')
-            for doc in docs_for_toc:
-                toc = doc.table_of_contents()
-                for p in descend_toc_pre_order(toc):
-                    p.element = None
-                tocs[doc.id] = toc
-
         # within the existing ascending expression date order, sort expressions so that we consider
         # primary language documents first
-        documents = sorted(documents, key=lambda d: 0 if d['language_id'] == self.country.primary_language_id else 1)
-
-        # return a list of all provisions to date
-        cumulative_provisions = []
+        return sorted(documents, key=lambda d: 0 if d['language_id'] == self.country.primary_language_id else 1)
 
-        # get a TOC plugin that can be shared across all these documents
-        locality = self.locality.code if self.locality else None
-        plugin = plugins.for_locale('toc', country=self.country.code, locality=locality, language=self.country.primary_language.code)
+    def commenceable_provisions_fingerprint(self, date=None):
+        """ Returns a value that changes whenever the commenceable provisions at `date` (if given) may have changed.
+        """
+        return tuple((d['id'], d['updated_at']) for d in self.commenceable_provisions_documents(date))
 
-        if plugin:
-            for i, doc in enumerate(documents):
-                # don't do any work if we've already cached the provisions for this doc
-                try:
-                    cumulative_provisions, cumulative_id_set = self._provision_cache[doc['id']]
-                except KeyError:
-                    # get the previous document's provisions and id set to build on
-                    previous_id = documents[i - 1]['id'] if i > 0 else None
-                    cumulative_provisions, cumulative_id_set = self._provision_cache.get(previous_id, ([], set()))
-                    # copy these because we'll change them
-                    cumulative_provisions = deepcopy(cumulative_provisions)
-                    cumulative_id_set = cumulative_id_set.copy()
-
-                    # update them based on the current toc
-                    plugin.insert_commenceable_provisions(tocs[doc['id']], cumulative_provisions, cumulative_id_set)
-
-                    # update the cache; provisions and id_set were updated in place
-                    self._provision_cache[doc['id']] = (cumulative_provisions, cumulative_id_set)
-
-        # this'll be the last document's cumulative_provisions, or []
-        return cumulative_provisions
+    def load_tocs_for_provisions(self, ids):
+        """ Returns a dict from document id to the table of contents of that document, for these expressions.
+        """
+        tocs = {}
+        docs_for_toc = self.expressions().filter(pk__in=ids) \
+            .select_related('language', 'language__language', 'work__locality', 'work__country', 'work__country__country')
+        for doc in docs_for_toc:
+            # the provisions may be cached, so don't keep the XML
+            tocs[doc.id] = [p.detach() for p in doc.table_of_contents()]
+        return tocs
 
     def all_uncommenced_provision_ids(self, date=None):
         """ Returns a (potentially empty) list of the ids of TOCElement objects that haven't yet commenced.
@@ -407,6 +394,13 @@ class Work(WorkMixin, models.Model):
 
     objects = WorkManager.from_queryset(WorkQuerySet)()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember where the work was loaded from, so that we can tell if it moves
+        instance._loaded_place = (instance.__dict__.get('country_id'), instance.__dict__.get('locality_id'))
+        return instance
+
     @property
     def locality_code(self):
         # Helper to get/set locality using the locality_code, used by the WorkSerializer.
@@ -529,6 +523,9 @@ def post_save_work(sender, instance, **kwargs):
             doc.updated_by_user = instance.updated_by_user
             doc.save()
 
+    if not kwargs['raw']:
+        cap_number_index.work_saved(instance)
+
     # Send action to activity stream, as 'created' if a new work
     if kwargs['created']:
         action.send(instance.created_by_user, verb='created', action_object=instance,
@@ -538,6 +535,11 @@ def post_save_work(sender, instance, **kwargs):
                     place_code=instance.place.place_code)
 
 
+@receiver(signals.post_delete, sender=Work)
+def post_delete_work(sender, instance, **kwargs):
+    cap_number_index.work_deleted(instance)
+
+
 # version tracking
 reversion.revisions.register(Work)
 
@@ -705,6 +707,8 @@ class Subtype(models.Model):
 
     # cheap cache for subtypes, to avoid DB lookups
     _cache = {}
+    # incremented when subtypes change, so that other caches built from subtypes can be rebuilt
+    _version = 0
 
     class Meta:
         verbose_name = 'Document subtype'
@@ -725,6 +729,8 @@ class Subtype(models.Model):
 
 
 @receiver(signals.post_save, sender=Subtype)
+@receiver(signals.post_delete, sender=Subtype)
 def on_subtype_saved(sender, instance, **kwargs):
     # clear the subtype cache
     Subtype._cache = {}
+    Subtype._version += 1
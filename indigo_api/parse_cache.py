@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ParsedDocumentCache:
+    """ A thread-safe, size-bounded, process-wide cache of parsed document XML (cobalt `StructuredDocument`
+    instances), shared across requests.
+
+    Parsed documents are keyed by the document's id and `updated_at`, and by the cobalt class used to parse them.
+    The XML that was parsed is kept with each parsed document, and a parsed document is only used if its XML is
+    the same as the XML being parsed, so that changes that don't update `updated_at` never cause the wrong XML to
+    be used. Only the most recent version of each document is kept, and the least recently used document is
+    discarded when the cache is full.
+
+    Cached documents are shared by everyone using them, and so must never be changed (see `Document.writable_doc`).
+    The table of contents of a cached document can also be kept with it, as a compact :class:`FlatTOC` that doesn't
+    refer to the XML.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or settings.INDIGO['PARSED_DOCUMENT_CACHE_SIZE']
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.documents = OrderedDict()
+
+    def get(self, document, cobalt_class):
+        """ Return a parsed `StructuredDocument` for this document's XML, which must not be changed.
+        """
+        xml = document.document_xml
+        key = (document.pk, document.updated_at, cobalt_class)
+
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is not None and entry[0] == xml:
+                self.documents.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # parse outside of the lock; at worst, two threads parse the same document
+        doc = cobalt_class(xml)
+
+        with self.lock:
+            others = [k for k in self.documents if k[0] == document.pk and k != key]
+            if any(k[1] > document.updated_at for k in others):
+                # this is an old version of the document, don't replace the newer one
+                return doc
+
+            # discard stale versions of this document
+            for stale in others:
+                del self.documents[stale]
+                self.evictions += 1
+            self.documents[key] = (xml, doc, None)
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.maxsize:
+                self.documents.popitem(last=False)
+                self.evictions += 1
+
+        return doc
+
+    def toc(self, document, cobalt_class, build):
+        """ Return the table of contents of this document as a :class:`FlatTOC`, which must not be changed.
+        If it isn't cached with the parsed document, `build()` is called to build it.
+        """
+        xml = document.document_xml
+        key = (document.pk, document.updated_at, cobalt_class)
+
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is not None and entry[0] == xml and entry[2] is not None:
+                return entry[2]
+
+        toc = build()
+
+        with self.lock:
+            # only keep it if the parsed document is still cached
+            entry = self.documents.get(key)
+            if entry is not None and entry[0] == xml:
+                self.documents[key] = (xml, entry[1], toc)
+
+        return toc
+
+    def stats(self):
+        """ Hit, miss and eviction counters, and the current number of cached documents.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.documents),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+parsed_document_cache = ParsedDocumentCache()
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+
+from django.core.cache import cache
+
+
+class CommenceableProvisionsCache:
+    """ A thread-safe, size-bounded, process-wide cache of the commenceable provisions of works, shared
+    across requests.
+
+    A work's commenceable provisions at a point in time are built up by layering the provisions of each of its
+    expressions in turn. Each layer is cached, keyed by the id and `updated_at` of every expression layered so
+    far, so that changing an expression only invalidates its own layer and later ones. The least recently used
+    layer is discarded when the cache is full.
+
+    Layers share structure with the layers beneath them: adding an expression copies only the lists and
+    provisions that it changes (see `TOCBuilderBase.insert_provisions`). The cached provisions must therefore
+    never be changed.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.layers = OrderedDict()
+
+    def provisions(self, plugin, documents, load_tocs):
+        """ Return the commenceable provisions for these documents, layered in order.
+
+        :param plugin: the TOC plugin used to layer the provisions
+        :param documents: list of dicts with the `id` and `updated_at` of each document, in the order to layer them
+        :param load_tocs: function that takes a list of document ids and returns a dict from id to document TOC
+        """
+        keys = []
+        layered = ()
+        for doc in documents:
+            layered = layered + ((doc['id'], doc['updated_at']),)
+            keys.append((plugin.__class__, layered))
+
+        # start from the last cached layer
+        provisions, id_set = [], set()
+        start = 0
+        for i in reversed(range(len(keys))):
+            layer = self.get(keys[i])
+            if layer is not None:
+                provisions, id_set = layer
+                start = i + 1
+                break
+
+        if start < len(documents):
+            tocs = load_tocs([doc['id'] for doc in documents[start:]])
+            for doc, key in zip(documents[start:], keys[start:]):
+                # the provisions and id set are shared with the layer beneath, so copy them before changing them
+                provisions = list(provisions)
+                id_set = set(id_set)
+                plugin.insert_commenceable_provisions(tocs[doc['id']], provisions, id_set)
+                self.put(key, (provisions, id_set))
+
+        # callers may change the top-level list
+        return list(provisions)
+
+    def get(self, key):
+        with self.lock:
+            layer = self.layers.get(key)
+            if layer is not None:
+                self.layers.move_to_end(key)
+                self.hits += 1
+            return layer
+
+    def put(self, key, layer):
+        with self.lock:
+            # every layer that is put has been built because it wasn't cached
+            self.misses += 1
+            self.layers[key] = layer
+            self.layers.move_to_end(key)
+            while len(self.layers) > self.maxsize:
+                self.layers.popitem(last=False)
+
+    def stats(self):
+        """ Hit and miss counters, and the current number of cached layers.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.layers),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.layers.clear()
+
+
+class CommencementDescriptionCache:
+    """ Caches descriptions of commenced (or uncommenced) provisions, such as "section 1–5; section 7(2)",
+    shared across requests.
+
+    A description is keyed by the provisions being described, the beautifier that describes them and the
+    fingerprint of the work's commenceable provisions. Saving a commencement changes its provisions and saving
+    a document changes the fingerprint, so neither can cause a stale description to be used.
+    """
+    prefix = 'commencement-descriptions'
+    # the descriptions also depend on code, which may change
+    timeout = 60 * 60 * 24
+
+    def cache_key(self, fingerprint, provision_ids, beautifier):
+        beautifier_class = beautifier.__class__
+        key = repr((
+            f'{beautifier_class.__module__}.{beautifier_class.__qualname__}',
+            beautifier.commenced,
+            fingerprint,
+            # only membership of the provision ids matters
+            sorted(set(provision_ids)),
+        ))
+        return f'{self.prefix}:{hashlib.sha256(key.encode("utf-8")).hexdigest()}'
+
+    def describe(self, work, date, provision_ids, beautifier):
+        """ Describe the provisions in `provision_ids`, out of the work's commenceable provisions at `date`.
+        """
+        key = self.cache_key(work.commenceable_provisions_fingerprint(date), provision_ids, beautifier)
+        description = cache.get(key)
+        if description is None:
+            provisions = deepcopy(work.all_commenceable_provisions(date))
+            description = beautifier.make_beautiful(provisions, provision_ids)
+            cache.set(key, description, timeout=self.timeout)
+        return description
+
+
+commenceable_provisions_cache = CommenceableProvisionsCache()
+commencement_descriptions = CommencementDescriptionCache()
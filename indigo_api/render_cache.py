@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import translation
+
+from indigo.analysis.toc.base import descend_toc_pre_order
+
+log = logging.getLogger(__name__)
+
+
+class RenderedHTMLCache:
+    """ Caches the HTML produced by running a document's XML through its XSLT stylesheet.
+
+    Entries are keyed by the document id, a hash of the document's XML, the identity of the
+    XSLT file and the parameters passed to the stylesheet. Changing any of these produces
+    a new key, so stale HTML is never served, and so nothing needs to be discarded when a
+    document is saved. Stale entries simply expire.
+
+    HTML for individual elements in the document's table of contents (such as chapters and
+    sections) can also be pre-rendered, so that requests for those elements can be
+    served without parsing the document.
+    """
+    prefix = 'rendered-html'
+    timeout = 60 * 60 * 24 * 30
+
+    @property
+    def cache(self):
+        return caches[settings.INDIGO.get('RENDERED_HTML_CACHE', 'default')]
+
+    def render(self, document, renderer, xml=None):
+        """ Render the XML for a document into HTML using the given XSLTRenderer, using
+        the cached HTML if it exists.
+
+        :param document: the document being rendered
+        :param renderer: an XSLTRenderer instance
+        :param xml: XML to render (defaults to document.document_xml)
+        """
+        xml = document.document_xml if xml is None else xml
+        key = self.cache_key(document, renderer, xml)
+        if key:
+            html = self.cache.get(key)
+            if html is not None:
+                return html
+
+        html = renderer.render_xml(xml)
+
+        if key:
+            self.cache.set(key, html, timeout=self.timeout)
+
+        return html
+
+    def get_element_html(self, document, renderer, component, subcomponent):
+        """ Return the pre-rendered HTML for an element (such as `section/5`) of a document,
+        or None if it hasn't been rendered.
+        """
+        key = self.cache_key(document, renderer, document.document_xml)
+        if key:
+            return self.cache.get(self.element_cache_key(key, component, subcomponent))
+
+    def render_elements(self, document, renderer):
+        """ Pre-render the HTML for each element in the document's table of contents.
+        """
+        key = self.cache_key(document, renderer, document.document_xml)
+        if not key:
+            return
+
+        fragments = {}
+        for item in descend_toc_pre_order(document.table_of_contents()):
+            if item.subcomponent:
+                element_key = self.element_cache_key(key, item.component, item.subcomponent)
+                # the first match wins, as with Document.get_subcomponent
+                if element_key not in fragments:
+                    fragments[element_key] = renderer.render(item.element)
+
+        self.cache.set_many(fragments, timeout=self.timeout)
+
+    def element_cache_key(self, key, component, subcomponent):
+        return f'{key}:{component}/{subcomponent}'
+
+    def cache_key(self, document, renderer, xml):
+        # unsaved documents aren't cached
+        if not document.id or not xml:
+            return None
+
+        if not isinstance(xml, bytes):
+            xml = xml.encode('utf-8')
+
+        fname = os.path.realpath(renderer.xslt_filename)
+        params = sorted(renderer.xslt_params.items())
+
+        digest = hashlib.sha256(xml)
+        digest.update(repr((fname, os.stat(fname).st_mtime_ns, params)).encode('utf-8'))
+
+        return f'{self.prefix}:{document.id}:{digest.hexdigest()}'
+
+    def warm(self, document):
+        """ Pre-render the HTML for this document and its elements using the default render
+        parameters, as used by the content API.
+        """
+        from indigo_api.exporters import HTMLExporter
+
+        try:
+            if document.document_xml:
+                renderer = HTMLExporter()._xml_renderer(document)
+                self.render(document, renderer)
+                self.render_elements(document, renderer)
+        except Exception as e:
+            log.error(f"Error pre-rendering HTML for {document}: {e}", exc_info=e)
+
+
+rendered_html_cache = RenderedHTMLCache()
+
+
+class DocumentRenditions:
+    """ Durable storage for pre-generated PDF and ePUB renditions of published documents.
+
+    Renditions are stored using Django's default file storage, under a name tied to the
+    document's id and a fingerprint of the document and the work-level details shown on its
+    coverpage (see `fingerprint`), so that a rendition is never served for a document that has
+    since changed. Only whole-document renditions using the default resolver are stored.
+
+    The coverpage is translated, so renditions are also tied to the language they were rendered in, and are only
+    served in that language. Pre-rendering uses the language that background tasks run in, which is usually
+    `settings.LANGUAGE_CODE`.
+    """
+    formats = ['pdf', 'epub']
+    prefix = 'renditions'
+
+    @property
+    def storage(self):
+        return default_storage
+
+    def get(self, document, format):
+        """ Return the content of a stored rendition, or None if there isn't one.
+        """
+        if not document.id or document.draft:
+            return None
+
+        name = self.filename(document, format, self.fingerprint(document))
+        if self.storage.exists(name):
+            with self.storage.open(name, 'rb') as f:
+                return f.read()
+
+    def render(self, document, format):
+        """ Render and store a rendition of the document in the given format.
+        """
+        content = self.get_exporter(document, format).render(document)
+
+        name = self.filename(document, format, self.fingerprint(document))
+        # don't let the storage rename the file if an older copy exists
+        if self.storage.exists(name):
+            self.storage.delete(name)
+        self.storage.save(name, ContentFile(content))
+
+        return content
+
+    def render_all(self, document):
+        """ Render and store all renditions for this document, discarding outdated ones.
+        """
+        self.clear(document, keep_current=True)
+        for format in self.formats:
+            if self.get(document, format) is None:
+                try:
+                    self.render(document, format)
+                except Exception as e:
+                    log.error(f"Error pre-rendering {format} for {document}: {e}", exc_info=e)
+
+    def clear(self, document, keep_current=False):
+        """ Delete stored renditions for this document.
+        """
+        # renditions in other languages are current if they have the same fingerprint
+        current = f'{self.fingerprint(document)}-' if keep_current else None
+        dirname = self.dirname(document)
+        try:
+            fnames = self.storage.listdir(dirname)[1]
+        except (FileNotFoundError, OSError):
+            return
+
+        for fname in fnames:
+            if not current or not fname.startswith(current):
+                self.storage.delete(f'{dirname}/{fname}')
+
+    def get_exporter(self, document, format):
+        # these must be the same exporters used to render on demand (see indigo_api.renderers)
+        from indigo_api.exporters import EPUBExporter, get_pdf_exporter
+
+        if format == 'pdf':
+            return get_pdf_exporter()
+        return EPUBExporter()
+
+    def fingerprint(self, document):
+        """ A hash of the details that a rendition of this document depends on.
+
+        Besides the document itself, the coverpage shows details of the work, its parent work, its amendments
+        and its commencements (including which provisions of its expressions have commenced), all of which can
+        change without the document changing.
+        """
+        work = document.work
+        parts = [
+            document.updated_at,
+            work.updated_at,
+            work.parent_work.updated_at if work.parent_work_id else None,
+            sorted(work.amendments.values_list('id', 'updated_at', 'amending_work__updated_at')),
+            sorted(work.commencements.values_list('id', 'updated_at', 'commencing_work__updated_at')),
+            work.commenceable_provisions_fingerprint(),
+        ]
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def dirname(self, document):
+        return f'{self.prefix}/{document.id}'
+
+    def filename(self, document, format, fingerprint):
+        language = translation.get_language() or settings.LANGUAGE_CODE
+        return f'{self.dirname(document)}/{fingerprint}-{language}.{format}'
+
+
+document_renditions = DocumentRenditions()
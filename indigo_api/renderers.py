@@ -1,16 +1,16 @@
 import lxml.etree as ET
-import tempfile
 import re
 import zipfile
 import logging
 
 from django.core.cache import caches
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.renderers import BaseRenderer, StaticHTMLRenderer
 from rest_framework_xml.renderers import XMLRenderer
 
-from indigo.plugins import plugins
-from indigo_api.exporters import HTMLExporter, PDFExporter, EPUBExporter
+from indigo_api.exporters import HTMLExporter, PDFExporter, EPUBExporter, get_pdf_exporter
+from indigo_api.render_cache import document_renditions
 from .serializers import NoopSerializer
 
 log = logging.getLogger(__name__)
@@ -92,6 +92,11 @@ class HTMLRenderer(StaticHTMLRenderer, ExporterMixin):
             return super(HTMLRenderer, self).render(document, media_type, renderer_context)
 
         view = renderer_context['view']
+
+        # pre-rendered element HTML
+        if getattr(view, 'element_html', None) is not None:
+            return view.element_html
+
         exporter = self.get_exporter()
 
         if not hasattr(view, 'component') or (view.component == 'main' and not view.subcomponent):
@@ -101,8 +106,8 @@ class HTMLRenderer(StaticHTMLRenderer, ExporterMixin):
         exporter.coverpage = renderer_context['request'].GET.get('coverpage') == '1'
         return exporter.render(document, view.element)
 
-    def get_exporter(self):
-        request = self.renderer_context['request']
+    def get_exporter(self, request=None):
+        request = request or self.renderer_context['request']
 
         exporter = super().get_exporter()
         exporter.standalone = request.GET.get('standalone') == '1'
@@ -113,6 +118,12 @@ class HTMLRenderer(StaticHTMLRenderer, ExporterMixin):
 
         return exporter
 
+    def cached_element_html(self, request, document, component, subcomponent):
+        """ Return pre-rendered HTML for an element of a document, or None. This is used by views
+        to avoid parsing the document when the element has already been rendered.
+        """
+        return self.get_exporter(request).cached_element_html(document, component, subcomponent)
+
 
 class PDFRenderer(BaseRenderer):
     """ Django Rest Framework PDF Renderer.
@@ -147,6 +158,12 @@ class PDFRenderer(BaseRenderer):
 
         filename = self.get_filename(data, view)
         renderer_context['response']['Content-Disposition'] = 'inline; filename=%s' % filename
+
+        # pre-generated rendition?
+        pdf = self.get_rendition(data, view)
+        if pdf:
+            return pdf
+
         request = renderer_context['request']
         exporter = self.get_exporter()
         exporter.resolver = resolver_url(request, request.GET.get('resolver'))
@@ -169,7 +186,15 @@ class PDFRenderer(BaseRenderer):
         return pdf
 
     def get_exporter(self, *args, **kwargs):
-        return plugins.for_locale('pdf-exporter')
+        return get_pdf_exporter()
+
+    def get_rendition(self, data, view):
+        """ Return the content of a pre-generated rendition of an entire document, if one exists
+        and the default resolver is being used.
+        """
+        if hasattr(data, 'frbr_uri') and not self.renderer_context['request'].GET.get('resolver'):
+            if not hasattr(view, 'component') or (view.component == 'main' and not view.subcomponent):
+                return document_renditions.get(data, self.format)
 
     def cache_key(self, data, view):
         if hasattr(data, 'frbr_uri'):
@@ -215,6 +240,12 @@ class EPUBRenderer(ExporterMixin, PDFRenderer):
 
         filename = self.get_filename(data, view)
         renderer_context['response']['Content-Disposition'] = 'inline; filename=%s' % filename
+
+        # pre-generated rendition?
+        epub = self.get_rendition(data, view)
+        if epub:
+            return epub
+
         exporter = self.get_exporter()
         exporter.resolver = resolver_url(request, request.GET.get('resolver'))
 
@@ -266,23 +297,71 @@ class ZIPRenderer(BaseRenderer):
         filename = generate_filename(data, view, self.format)
         renderer_context['response']['Content-Disposition'] = 'attachment; filename=%s' % filename
 
-        with tempfile.NamedTemporaryFile(suffix='.zip') as f:
-            self.build_zipfile(data, f.name)
-            return f.read()
-
-    def build_zipfile(self, data, fname):
-        # one or many documents?
         many = isinstance(data, list)
-        if not many:
-            data = [data]
-
-        with zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for document in data:
+        return b''.join(self.stream_zipfile(data if many else [data], many))
+
+    def streaming_response(self, documents, view):
+        """ Build a response that streams a zipfile of many documents, without holding the
+        entire zipfile in memory.
+
+        :param documents: an iterable of documents, such as `queryset.iterator()`
+        """
+        response = StreamingHttpResponse(self.stream_zipfile(documents, True), content_type=self.media_type)
+        filename = generate_filename(None, view, self.format)
+        response['Content-Disposition'] = 'attachment; filename=%s' % filename
+        return response
+
+    def stream_zipfile(self, documents, many):
+        """ Generator that yields the bytes of a zipfile for the documents, as it is built.
+        """
+        buf = StreamingBuffer()
+
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for document in documents:
                 # if storing many, prefix them
                 prefix = (generate_filename(document, None) + '/') if many else ''
                 zf.writestr(prefix + "main.xml", document.document_xml.encode('utf-8'))
-                self.add_attachments(document, zf, prefix)
+                yield buf.drain()
+
+                for chunk in self.add_attachments(document, zf, prefix):
+                    yield buf.drain()
+
+        yield buf.drain()
 
     def add_attachments(self, document, zf, prefix):
+        """ Add attachments to the zipfile, yielding after each chunk of attachment data is written.
+        """
         for attachment in document.attachments.all():
-            zf.writestr(prefix + "media/" + attachment.filename, attachment.file.read())
+            zinfo = zipfile.ZipInfo(prefix + "media/" + attachment.filename, date_time=attachment.updated_at.timetuple()[:6])
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(zinfo, 'w', force_zip64=attachment.size >= zipfile.ZIP64_LIMIT) as f:
+                for chunk in attachment.file.chunks():
+                    f.write(chunk)
+                    yield
+
+
+class StreamingBuffer:
+    """ A write-only, unseekable file-like object that holds data written to it until it is drained.
+    This lets a zipfile be streamed while it is being written.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """ Return and discard the data written so far.
+        """
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
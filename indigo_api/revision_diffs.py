@@ -0,0 +1,81 @@
+import logging
+
+import lxml.html
+from django.core.cache import cache
+from reversion.models import Version
+
+from indigo.analysis.differ import AttributeDiffer
+
+log = logging.getLogger(__name__)
+
+
+class RevisionDiffCache:
+    """ Caches the differences between the content of consecutive versions of a document, as shown in the
+    document's history, shared across requests.
+
+    Versions never change, so a diff is keyed by the ids of the two versions and the differ's version. Diffs can be
+    pre-computed in the background when a revision is created (see INDIGO['PRECOMPUTE_REVISION_DIFFS']), so that
+    they don't have to be computed when they're first viewed.
+    """
+    prefix = 'revision-diffs'
+    # the diffs also depend on how documents are rendered as HTML, which may change
+    timeout = 60 * 60 * 24 * 30
+
+    def cache_key(self, old_version, new_version, differ):
+        return f'{self.prefix}:{old_version.pk if old_version else "-"}:{new_version.pk}:{differ.version}'
+
+    def diff(self, old_version, new_version):
+        """ The differences between the content of two versions of a document, as a dict with the `content` of
+        the diff as HTML and the number of changes, `n_changes`.
+
+        :param old_version: the older version, or None if `new_version` is the first version
+        :param new_version: the newer version
+        """
+        differ = AttributeDiffer()
+        key = self.cache_key(old_version, new_version, differ)
+        diff = cache.get(key)
+        if diff is None:
+            diff = self.compute(differ, old_version, new_version)
+            cache.set(key, diff, timeout=self.timeout)
+        return diff
+
+    def compute(self, differ, old_version, new_version):
+        if old_version:
+            old_document = old_version._object_version.object
+            old_document.document_xml = differ.preprocess_document_diff(old_document.document_xml)
+            old_html = old_document.to_html()
+        else:
+            old_html = ""
+
+        new_document = new_version._object_version.object
+        new_document.document_xml = differ.preprocess_document_diff(new_document.document_xml)
+        new_html = new_document.to_html()
+
+        old_tree = lxml.html.fromstring(old_html) if old_html else None
+        new_tree = lxml.html.fromstring(new_html)
+        n_changes, diff = differ.diff_document_html(old_tree, new_tree)
+
+        if not isinstance(diff, str):
+            diff = lxml.html.tostring(diff, encoding='unicode')
+
+        return {
+            'content': diff,
+            'n_changes': n_changes,
+        }
+
+    def previous_version(self, version):
+        """ The version of the same document just before this one, or None.
+        """
+        return Version.objects \
+            .filter(content_type_id=version.content_type_id, object_id=version.object_id, pk__lt=version.pk) \
+            .defer('serialized_data') \
+            .order_by('-pk') \
+            .first()
+
+    def warm(self, version):
+        """ Compute and cache the diff between this version of a document and the previous one.
+        """
+        self.diff(self.previous_version(version), version)
+
+
+revision_diffs = RevisionDiffCache()
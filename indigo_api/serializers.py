@@ -428,6 +428,15 @@ class DocumentAPISerializer(serializers.Serializer):
         self.fields['document'].instance = self.instance
 
 
+class DocumentAnalysisSerializer(DocumentAPISerializer):
+    """ Helper to handle input documents for the document analysis APIs.
+    """
+    # eIds of the elements that have changed and so need to be analysed, if known
+    changed_eids = serializers.ListField(child=serializers.CharField(), required=False, allow_null=True)
+    # only analyse elements that differ from the saved document
+    incremental = serializers.BooleanField(required=False, default=False)
+
+
 class NoopSerializer(object):
     """
     Serializer that doesn't do any serializing, it just makes
@@ -3,8 +3,12 @@ import logging
 
 from background_task import background
 from background_task.models import Task
+from reversion.models import Version
 
-from indigo_api.models import Document
+from indigo_api.bulk_analysis import BulkAnalyser
+from indigo_api.models import Country, Document
+from indigo_api.render_cache import rendered_html_cache, document_renditions
+from indigo_api.revision_diffs import revision_diffs
 
 # get specific task logger
 log = logging.getLogger('indigo.tasks')
@@ -32,6 +36,57 @@ def prune_document_versions():
         raise e
 
 
+@background(queue="indigo", remove_existing_tasks=True)
+def prerender_document(document_id):
+    """ Pre-render the HTML, PDF and ePUB for a published document, so that readers
+    don't have to wait for them to be generated.
+    """
+    document = Document.objects.filter(pk=document_id).first()
+    if not document:
+        log.warning(f"Document with id {document_id} doesn't exist, ignoring")
+        return
+
+    if document.draft or document.deleted:
+        log.info(f"Not pre-rendering draft or deleted document {document}")
+        return
+
+    log.info(f"Pre-rendering document {document}")
+    rendered_html_cache.warm(document)
+    document_renditions.render_all(document)
+
+
+@background(queue="indigo")
+def precompute_revision_diff(version_id):
+    """ Compute the diff between a version of a document and the previous version, so that it doesn't have to be
+    computed when the document's history is viewed.
+    """
+    version = Version.objects.filter(pk=version_id).first()
+    if not version:
+        log.warning(f"Version with id {version_id} doesn't exist, ignoring")
+        return
+
+    log.info(f"Pre-computing the diff for version {version_id}")
+    revision_diffs.warm(version)
+
+
+@background(queue="indigo")
+def analyse_documents(place, doctype, steps, after_id=None):
+    """ Analyse the documents in a place in bulk, such as linking terms and references.
+
+    Each task analyses a limited number of documents and then queues another task to analyse the rest, so that
+    an interrupted task only has to redo its own documents.
+    """
+    country, locality = Country.get_country_locality(place)
+    analyser = BulkAnalyser(steps)
+    documents = analyser.documents(country, locality, doctype)
+
+    after_id = analyser.analyse(documents, after_id, limit=analyser.batch_size * 10)
+    if after_id and documents.filter(pk__gt=after_id).exists():
+        analyse_documents(place, doctype, steps, after_id)
+    else:
+        log.info(f"Finished analysing documents for {place}")
+
+
 def setup_pruning():
     # schedule task to run in 12 hours time, and repeat daily
     prune_deleted_documents(schedule=timedelta(hours=12), repeat=Task.DAILY)
@@ -1,9 +1,8 @@
-from copy import deepcopy
-
 from django import template
 from django.conf import settings
 
 from indigo.plugins import plugins
+from indigo_api.provisions_cache import commencement_descriptions
 
 register = template.Library()
 
@@ -34,12 +33,11 @@ def commenced_provisions_description(document, commencement, uncommenced=False):
     if commencement and commencement.date and date > commencement.date:
         date = commencement.date
 
-    provisions = deepcopy(document.work.all_commenceable_provisions(date))
     provision_ids = document.work.all_uncommenced_provision_ids(document.expression_date) if uncommenced else commencement.provisions
     beautifier = plugins.for_document('commencements-beautifier', document)
     beautifier.commenced = not uncommenced
 
-    return beautifier.make_beautiful(provisions, provision_ids)
+    return commencement_descriptions.describe(document.work, date, provision_ids, beautifier)
 
 
 @register.simple_tag
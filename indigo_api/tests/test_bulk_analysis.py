@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from reversion.models import Version
+
+from indigo_api.bulk_analysis import BulkAnalyser, analyse_document
+from indigo_api.models import Country, Document
+from indigo_api.tests.fixtures import document_fixture
+
+
+class BulkAnalysisTestCase(TestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work', 'published']
+
+    def setUp(self):
+        self.document = Document.objects.get(pk=1)
+        self.document.content = document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <content>
+            <p>See section 2.</p>
+          </content>
+        </section>
+        <section eId="sec_2">
+          <num>2.</num>
+          <content>
+            <p>Nothing to see.</p>
+          </content>
+        </section>""")
+        self.document.save()
+
+    def test_analyse_document(self):
+        document_id, updated_at, content = analyse_document(self.document.pk, ['references'])
+        self.assertEqual(self.document.pk, document_id)
+        self.assertEqual(self.document.updated_at, updated_at)
+        self.assertIn('<p>See <ref href="#sec_2">section 2</ref>.</p>', content)
+
+        # nothing changes
+        self.document.content = content
+        self.document.save()
+        self.assertIsNone(analyse_document(self.document.pk, ['references'])[2])
+
+    def test_documents(self):
+        analyser = BulkAnalyser(['references'])
+        documents = analyser.documents(Country.for_code('za'), doctype='act')
+        self.assertIn(self.document, documents)
+        self.assertNotIn(self.document, analyser.documents(Country.for_code('za'), doctype='bill'))
+
+    def test_save_batch(self):
+        analyser = BulkAnalyser(['references'])
+        result = analyse_document(self.document.pk, ['references'])
+        analyser.save_batch([result])
+
+        self.document.refresh_from_db()
+        self.assertIn('<ref href="#sec_2">section 2</ref>', self.document.document_xml)
+        self.assertEqual(1, analyser.changed)
+        version = Version.objects.get_for_object(self.document).first()
+        self.assertEqual('Bulk analysis: references', version.revision.comment)
+
+    def test_save_batch_skips_changed_documents(self):
+        analyser = BulkAnalyser(['references'])
+        result = analyse_document(self.document.pk, ['references'])
+
+        # the document changes while it is being analysed
+        self.document.save()
+        analyser.save_batch([result])
+
+        self.document.refresh_from_db()
+        self.assertNotIn('<ref', self.document.document_xml)
+        self.assertEqual(0, analyser.changed)
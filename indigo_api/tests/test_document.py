@@ -1,8 +1,10 @@
 from nose.tools import *  # noqa
+from django.core.management import call_command
 from django.test import TestCase
 from datetime import date
+from mock import patch
 
-from indigo_api.models import Document, Work, Amendment, Language, Country, User
+from indigo_api.models import Document, Work, Amendment, Language, Country, User, Annotation
 from indigo_api.tests.fixtures import *  # noqa
 
 
@@ -131,6 +133,35 @@ class DocumentTestCase(TestCase):
         assert_is_none(d.get_subcomponent('main', 'chapter/99'))
         assert_is_none(d.get_subcomponent('main', 'section/99'))
 
+    def test_element_index(self):
+        d = Document(language=self.eng)
+        d.work = self.work
+        d.content = document_fixture(xml="""
+        <body xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0">
+          <section eId="sec_1">
+            <num>1.</num>
+            <heading>Foo</heading>
+            <content>
+              <p eId="sec_1__p_1">hello</p>
+            </content>
+          </section>
+        </body>
+        """)
+
+        index = d.element_index()
+        assert_is(index, d.element_index())
+        assert_equal(index.element_by_eid('main', 'sec_1__p_1').get('eId'), 'sec_1__p_1')
+        assert_is_none(index.element_by_eid('main', 'sec_99'))
+        assert_equal(index.subcomponent('main', 'section/1').get('eId'), 'sec_1')
+
+        anchor = Annotation(document=d, anchor_id='sec_1__p_1__list_1').resolve_anchor()
+        assert_equal(anchor.element.get('eId'), 'sec_1__p_1')
+        assert_false(anchor.exact_match)
+
+        # a new document discards the index
+        d.reset_xml(d.document_xml)
+        assert_is_not(index, d.element_index())
+
     def test_is_latest(self):
         d = Document(work=self.work)
         d.expression_date = ''
@@ -168,3 +199,100 @@ class DocumentTestCase(TestCase):
         self.assertEqual('A general consolidation note that applies to all consolidations in this place.', d.work.consolidation_note())
         d = Document.objects.get(id=4)
         self.assertEqual('A special consolidation note just for this work', d.work.consolidation_note())
+
+    def toc_headings(self, toc_json):
+        return [t['heading'] for t in toc_json]
+
+    def test_toc_json_stored(self):
+        d = Document.objects.get(id=1)
+        d.content = document_fixture(xml='<section eId="sec_1"><num>1.</num><heading>First</heading><content><p>x</p></content></section>')
+        d.save()
+        self.assertEqual(['First'], self.toc_headings(d.toc_json))
+
+        d = Document.objects.get(id=1)
+        self.assertEqual(['First'], self.toc_headings(d.table_of_contents_json()))
+
+    def test_toc_json_reset_with_xml(self):
+        d = Document.objects.get(id=1)
+        d.content = document_fixture(xml='<section eId="sec_1"><num>1.</num><heading>First</heading><content><p>x</p></content></section>')
+        d.save()
+
+        # the stored table of contents must never be used for different xml
+        d.content = document_fixture(xml='<section eId="sec_2"><num>2.</num><heading>Second</heading><content><p>x</p></content></section>')
+        self.assertIsNone(d.toc_json)
+        self.assertEqual(['Second'], self.toc_headings(d.table_of_contents_json()))
+        d.save()
+        self.assertEqual(['Second'], self.toc_headings(Document.objects.get(id=1).toc_json))
+
+    def test_toc_json_missing(self):
+        # as for documents last saved before the table of contents was stored
+        Document.objects.filter(id=1).update(toc_json=None)
+        d = Document.objects.get(id=1)
+        expected = [t.as_dict() for t in d.table_of_contents()]
+        self.assertEqual(expected, d.table_of_contents_json())
+
+        d.save()
+        self.assertEqual(expected, Document.objects.get(id=1).toc_json)
+
+    def test_rebuild_toc_json(self):
+        d = Document.objects.get(id=1)
+        updated_at = d.updated_at
+        expected = [t.as_dict() for t in d.table_of_contents()]
+
+        # as if the table of contents plugin had changed
+        Document.objects.filter(id=1).update(toc_json=[{'title': 'Stale'}])
+        call_command('rebuild_toc_json', 'za')
+
+        d = Document.objects.get(id=1)
+        self.assertEqual(expected, d.toc_json)
+        self.assertEqual(updated_at, d.updated_at)
+
+    def save_syncs_xml(self, document):
+        """ Save the document, and return whether its XML was re-synced with the model and work attributes.
+        """
+        with patch.object(Document, 'copy_attributes', autospec=True, side_effect=Document.copy_attributes) as copy_attributes:
+            document.save()
+        return copy_attributes.called
+
+    def synced_document(self, id):
+        # the fixtures don't record the hash of the synced attributes, so save once to record it
+        Document.objects.get(id=id).save()
+        return Document.objects.get(id=id)
+
+    def test_publish_skips_xml_sync(self):
+        d = self.synced_document(1)
+        xml = d.document_xml
+        d.draft = True
+        self.assertFalse(self.save_syncs_xml(d))
+
+        d = Document.objects.get(id=1)
+        self.assertTrue(d.draft)
+        self.assertEqual(xml, d.document_xml)
+
+    def test_work_change_syncs_xml(self):
+        d = self.synced_document(1)
+        d.work.publication_name = 'Changed Gazette'
+        d.work.save()
+        self.assertTrue(self.save_syncs_xml(d))
+        self.assertIn('Changed Gazette', Document.objects.get(id=1).document_xml)
+
+    def test_repeal_syncs_xml(self):
+        rep = Work.objects.get(id=2)
+        d = self.synced_document(1)
+        d.work.repealed_by = rep
+        d.work.repealed_date = rep.publication_date
+        d.work.save()
+        self.assertTrue(self.save_syncs_xml(d))
+        self.assertIn(rep.frbr_uri, Document.objects.get(id=1).document_xml)
+
+    def test_amendment_syncs_xml(self):
+        user = User.objects.get(pk=1)
+        d = self.synced_document(3)
+        self.assertFalse(self.save_syncs_xml(d))
+        d = Document.objects.get(id=3)
+
+        amending = Work.objects.get(id=1)
+        Amendment.objects.create(amending_work=amending, amended_work=d.work, date=date(2011, 12, 10), created_by_user=user)
+        d = Document.objects.get(id=3)
+        self.assertTrue(self.save_syncs_xml(d))
+        self.assertIn(amending.frbr_uri, Document.objects.get(id=3).document_xml)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import json
 import tempfile
 from mock import patch
 import datetime
@@ -13,6 +14,7 @@ from sass_processor.processor import SassProcessor
 from indigo_api.tests.fixtures import *  # noqa
 from indigo_api.exporters import PDFExporter
 from indigo_api.models import Work, Attachment
+from indigo_api.views.documents import DocumentViewSet
 
 
 # Ensure the processor runs during tests. It doesn't run when DEBUG=False (ie. during testing),
@@ -211,7 +213,14 @@ class DocumentAPITest(APITestCase):
                     },
                 ],
             },
-        ], response.data['toc'])
+        ], json.loads(response.content.decode('utf-8'))['toc'])
+
+    def test_document_toc_overridden(self):
+        # views that change the table of contents don't use the pre-encoded one
+        with patch.object(DocumentViewSet, 'table_of_contents', return_value=[{'title': 'Custom'}]):
+            response = self.client.get('/api/documents/1/toc')
+        assert_equal(response.status_code, 200)
+        self.assertEqual([{'title': 'Custom'}], response.data['toc'])
 
     def test_attachment_as_media(self):
         id = 1
@@ -0,0 +1,69 @@
+import datetime
+
+from django.test import SimpleTestCase
+from django.utils import translation
+from lxml import etree
+from mock import patch
+
+from indigo_api.exporters import PDFExporter
+from indigo_api.models import Document, Work
+from indigo_api.render_cache import DocumentRenditions
+
+
+class PDFExporterTestCase(SimpleTestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.exporter = PDFExporter()
+
+    def outline(self, xml):
+        return etree.fromstring(f'<outline xmlns="{PDFExporter.outline_ns}"><item title="" page="0">{xml}</item></outline>')
+
+    def test_combine_outlines(self):
+        outlines = [
+            self.outline('<item title="Act 1" page="1" link="#a" backLink="#b"><item title="Section 1" page="2"/></item>'),
+            self.outline('<item title="Act 2" page="1"><item title="Section 1" page="3"/></item>'),
+        ]
+        combined = self.exporter.combine_outlines(outlines, [4, 5], 2)
+
+        self.assertEqual(
+            f'<outline xmlns="{PDFExporter.outline_ns}"><item title="" page="0" link="" backLink="">'
+            '<item title="Act 1" page="3"><item title="Section 1" page="4"/></item>'
+            '<item title="Act 2" page="7"><item title="Section 1" page="9"/></item>'
+            '</item></outline>',
+            etree.tostring(combined, encoding='unicode'))
+
+    @patch.object(PDFExporter, 'toc_xsl', return_value='toc.xsl')
+    @patch('indigo_api.exporters.load_xslt', return_value=lambda combined: '')
+    def test_render_combined_toc_offsets(self, load_xslt, toc_xsl):
+        parts = [('part-0.pdf', b'<outline/>'), ('part-1.pdf', b'<outline/>')]
+        # the parts have 4 and 5 pages, and the table of contents turns out to have 2 pages
+        pages = {'part-0.pdf': 4, 'part-1.pdf': 5, 'toc-0.pdf': 2, 'toc-1.pdf': 2}
+
+        with patch('indigo_api.exporters.pdf_count_pages', side_effect=lambda fname: pages[fname]), \
+                patch.object(PDFExporter, 'html_to_pdf_file', side_effect=lambda html, tmpdir, name: f'{name}.pdf'), \
+                patch.object(PDFExporter, 'combine_outlines') as combine_outlines:
+            self.assertEqual('toc-1.pdf', self.exporter.render_combined_toc(parts, 1, 'tmp'))
+
+        # one page for the colophon, then one and then two pages for the table of contents
+        self.assertEqual([2, 3], [args[2] for args, kwargs in combine_outlines.call_args_list])
+        self.assertEqual([4, 5], combine_outlines.call_args[0][1])
+
+    def test_part_cache_key(self):
+        class LocalPDFExporter(PDFExporter):
+            pass
+
+        document = Document(pk=1, work=Work(frbr_uri='/akn/za/act/2005/1'),
+                            updated_at=datetime.datetime(2021, 1, 1, 10, 0))
+        self.assertIsNone(self.exporter.part_cache_key(Document(work=document.work)))
+
+        with translation.override('en'), \
+                patch.object(DocumentRenditions, 'fingerprint', return_value='one') as fingerprint:
+            key = self.exporter.part_cache_key(document)
+            self.assertNotEqual(key, LocalPDFExporter().part_cache_key(document))
+            with translation.override('fr'):
+                self.assertNotEqual(key, self.exporter.part_cache_key(document))
+
+            # eg. a commencement of the work changed
+            fingerprint.return_value = 'two'
+            self.assertNotEqual(key, self.exporter.part_cache_key(document))
@@ -0,0 +1,122 @@
+import datetime
+
+from django.test import SimpleTestCase
+from mock import patch
+
+from indigo.analysis.toc.base import TOCElement, toc_to_json
+from indigo_api.models import Document, Work
+from indigo_api.parse_cache import ParsedDocumentCache, parsed_document_cache
+from indigo_api.tests.fixtures import document_fixture
+
+
+class ParsedDocumentCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.work = Work(frbr_uri='/akn/za/act/2005/1')
+        self.updated_at = datetime.datetime(2021, 1, 1, 10, 0)
+        parsed_document_cache.clear()
+
+    def make_document(self, pk=1, text='hello', updated_at=None):
+        document = Document(pk=pk, work=self.work, updated_at=updated_at or self.updated_at,
+                            document_xml=document_fixture(text=text))
+        # as if it had been loaded from the database
+        document._loaded_document_xml = document.document_xml
+        return document
+
+    def test_cache_hits(self):
+        cache = ParsedDocumentCache(maxsize=2)
+        document = self.make_document()
+        doc = cache.get(document, document.cobalt_class)
+        self.assertIs(doc, cache.get(self.make_document(), document.cobalt_class))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}, cache.stats())
+
+    def test_cache_reparses_changed_xml(self):
+        cache = ParsedDocumentCache(maxsize=2)
+        document = self.make_document()
+        doc = cache.get(document, document.cobalt_class)
+
+        # same updated_at, but different XML
+        changed = self.make_document(text='changed')
+        self.assertIsNot(doc, cache.get(changed, changed.cobalt_class))
+        self.assertIn('changed', cache.get(changed, changed.cobalt_class).to_xml().decode('utf-8'))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0, 'size': 1}, cache.stats())
+
+        # a newer version replaces the old one
+        newer = self.make_document(updated_at=self.updated_at + datetime.timedelta(seconds=1))
+        cache.get(newer, newer.cobalt_class)
+        self.assertEqual({'hits': 1, 'misses': 3, 'evictions': 1, 'size': 1}, cache.stats())
+
+    def test_cache_keeps_newest_version(self):
+        cache = ParsedDocumentCache(maxsize=2)
+        newer = self.make_document(updated_at=self.updated_at + datetime.timedelta(seconds=1))
+        doc = cache.get(newer, newer.cobalt_class)
+
+        # an older copy of the document doesn't replace the newer one
+        older = self.make_document()
+        cache.get(older, older.cobalt_class)
+        self.assertIs(doc, cache.get(newer, newer.cobalt_class))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0, 'size': 1}, cache.stats())
+
+    def test_cache_evicts_lru(self):
+        cache = ParsedDocumentCache(maxsize=2)
+        for pk in [1, 2, 1, 3, 1]:
+            document = self.make_document(pk=pk)
+            cache.get(document, document.cobalt_class)
+        self.assertEqual({'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2}, cache.stats())
+
+    def test_documents_share_parsed_xml(self):
+        one = self.make_document()
+        two = self.make_document()
+        self.assertIs(one.doc, two.doc)
+        self.assertFalse(one.xml_needs_sync(one.xml_sync_hash))
+
+        # unsaved documents aren't shared
+        self.assertIsNot(one.doc, self.make_document(pk=None).doc)
+
+        # nor is XML that has changed since it was loaded
+        changed = self.make_document()
+        changed.document_xml = document_fixture(text='changed')
+        self.assertIsNot(one.doc, changed.doc)
+        self.assertIn('changed', changed.doc.to_xml().decode('utf-8'))
+        self.assertEqual(1, parsed_document_cache.stats()['size'])
+
+        # nor documents that weren't loaded from the database
+        document = self.make_document()
+        document._loaded_document_xml = None
+        self.assertIsNot(one.doc, document.doc)
+
+    def test_writable_doc(self):
+        one = self.make_document()
+        two = self.make_document()
+        shared = one.doc
+        # as if the table of contents had been built from the shared document
+        one._toc = []
+
+        # changing the writable document doesn't change the shared one
+        writable = one.writable_doc
+        self.assertIsNot(shared, writable)
+        self.assertIs(writable, one.doc)
+        self.assertIs(writable, one.writable_doc)
+        self.assertFalse(hasattr(one, '_toc'))
+        writable.title = 'Changed'
+        self.assertNotEqual('Changed', two.doc.title)
+        self.assertIs(shared, two.doc)
+        self.assertTrue(one.xml_needs_sync(one.xml_sync_hash))
+
+    def test_shared_table_of_contents(self):
+        toc = [TOCElement(None, 'main', 'section', num='1', id_='sec_1', subcomponent='section/1', heading='One')]
+        toc[0].title = '1. One'
+        one = self.make_document()
+
+        with patch.object(Document, 'table_of_contents', return_value=toc) as table_of_contents:
+            flat = one.flat_table_of_contents()
+            # documents with the same parsed XML share it
+            self.assertIs(flat, self.make_document().flat_table_of_contents())
+            self.assertEqual(toc_to_json(toc), self.make_document().table_of_contents_json_text())
+            self.assertEqual([t.as_dict() for t in toc], self.make_document().table_of_contents_json())
+            self.assertEqual(1, table_of_contents.call_count)
+
+            # but not with documents that have changed
+            changed = self.make_document()
+            changed.writable_doc.title = 'Changed'
+            self.assertIsNot(flat, changed.flat_table_of_contents())
+            self.assertEqual(2, table_of_contents.call_count)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.test import SimpleTestCase, override_settings
+from mock import MagicMock
+
+from indigo.analysis.toc.base import CommencementsBeautifier, TOCBuilderBase, TOCElement, descend_toc_pre_order
+from indigo_api.provisions_cache import CommenceableProvisionsCache, CommencementDescriptionCache
+
+
+class CommenceableProvisionsCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache = CommenceableProvisionsCache()
+        self.plugin = TOCBuilderBase()
+        self.loaded = []
+        self.tocs = {
+            1: ['sec_1', 'sec_2'],
+            2: ['sec_1', 'sec_1A', 'sec_2'],
+            3: ['sec_1', 'sec_2', 'sec_3'],
+        }
+
+    def load_tocs(self, ids):
+        self.loaded.extend(ids)
+        return {
+            i: [TOCElement(None, 'main', 'section', id_=eid, num='1', children=[
+                TOCElement(None, 'main', 'subsection', id_=f'{eid}__subsec_{i}', num='(1)'),
+            ]) for eid in self.tocs[i]]
+            for i in ids
+        }
+
+    def documents(self, *ids, updated_at=datetime.datetime(2020, 1, 1)):
+        return [{'id': i, 'updated_at': updated_at} for i in ids]
+
+    def provision_ids(self, provisions):
+        return [p.id for p in descend_toc_pre_order(provisions)]
+
+    def test_layers(self):
+        first = self.cache.provisions(self.plugin, self.documents(1), self.load_tocs)
+        self.assertEqual(['sec_1', 'sec_1__subsec_1', 'sec_2', 'sec_2__subsec_1'], self.provision_ids(first))
+
+        provisions = self.cache.provisions(self.plugin, self.documents(1, 2, 3), self.load_tocs)
+        self.assertEqual([
+            'sec_1', 'sec_1__subsec_1', 'sec_1__subsec_2', 'sec_1__subsec_3',
+            'sec_1A', 'sec_1A__subsec_2',
+            'sec_2', 'sec_2__subsec_1', 'sec_2__subsec_2', 'sec_2__subsec_3',
+            'sec_3', 'sec_3__subsec_3',
+        ], self.provision_ids(provisions))
+        # the first document's toc was only loaded once
+        self.assertEqual([1, 2, 3], self.loaded)
+
+        # earlier layers are unchanged
+        self.assertEqual(['sec_1', 'sec_1__subsec_1', 'sec_2', 'sec_2__subsec_1'],
+                         self.provision_ids(self.cache.provisions(self.plugin, self.documents(1), self.load_tocs)))
+        self.assertEqual([1, 2, 3], self.loaded)
+
+    def test_updated(self):
+        self.cache.provisions(self.plugin, self.documents(1, 2), self.load_tocs)
+        self.loaded = []
+
+        documents = self.documents(1, 2)
+        documents[1]['updated_at'] = datetime.datetime(2020, 2, 1)
+        self.cache.provisions(self.plugin, documents, self.load_tocs)
+        self.assertEqual([2], self.loaded)
+        self.assertEqual({'hits': 1, 'misses': 3, 'size': 3}, self.cache.stats())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CommencementDescriptionCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.descriptions = CommencementDescriptionCache()
+        self.work = MagicMock()
+        self.work.commenceable_provisions_fingerprint.return_value = ((1, datetime.datetime(2020, 1, 1)),)
+        self.work.all_commenceable_provisions.return_value = [
+            TOCElement(None, 'main', 'section', id_=f'sec_{n}', num=f'{n}.', basic_unit=True)
+            for n in range(1, 6)
+        ]
+
+    def test_describe(self):
+        beautifier = CommencementsBeautifier()
+        self.assertEqual('section 1–3', self.descriptions.describe(self.work, None, ['sec_1', 'sec_2', 'sec_3'], beautifier))
+        self.assertEqual('section 1–3', self.descriptions.describe(self.work, None, ['sec_3', 'sec_2', 'sec_1'], beautifier))
+        self.assertEqual(1, self.work.all_commenceable_provisions.call_count)
+
+        # different provisions
+        self.assertEqual('section 4–5', self.descriptions.describe(self.work, None, ['sec_4', 'sec_5'], beautifier))
+        self.assertEqual(2, self.work.all_commenceable_provisions.call_count)
+
+        # uncommenced provisions are described separately
+        beautifier.commenced = False
+        self.assertEqual('section 1–3', self.descriptions.describe(self.work, None, ['sec_1', 'sec_2', 'sec_3'], beautifier))
+        self.assertEqual(3, self.work.all_commenceable_provisions.call_count)
+
+    def test_document_changed(self):
+        beautifier = CommencementsBeautifier()
+        self.descriptions.describe(self.work, None, ['sec_1'], beautifier)
+        self.work.commenceable_provisions_fingerprint.return_value = ((1, datetime.datetime(2020, 2, 1)),)
+        self.descriptions.describe(self.work, None, ['sec_1'], beautifier)
+        self.assertEqual(2, self.work.all_commenceable_provisions.call_count)
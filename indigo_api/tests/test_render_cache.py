@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import translation
+from mock import MagicMock, patch
+
+from indigo.analysis.toc.base import TOCElement
+from indigo_api.models import Commencement, Document, Work
+from indigo_api.render_cache import DocumentRenditions, RenderedHTMLCache
+from indigo_api.renderers import EPUBRenderer, PDFRenderer
+from indigo_api.signals import document_published
+from indigo_api.tests.fixtures import document_fixture
+
+
+class FakeRenderer:
+    """ Stands in for an XSLTRenderer, recording what it renders.
+    """
+    def __init__(self, xslt_filename, xslt_params=None):
+        self.xslt_filename = xslt_filename
+        self.xslt_params = xslt_params or {}
+        self.rendered = []
+
+    def render_xml(self, xml):
+        self.rendered.append(xml)
+        return f'<div>{len(self.rendered)}</div>'
+
+    def render(self, element):
+        self.rendered.append(element)
+        return f'<div>{element}</div>'
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RenderedHTMLCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.html_cache = RenderedHTMLCache()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.xslt_filename = os.path.join(self.tmpdir.name, 'act.xsl')
+        with open(self.xslt_filename, 'w') as f:
+            f.write('<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"/>')
+        self.renderer = FakeRenderer(self.xslt_filename)
+        self.document = Document(pk=1, work=Work(frbr_uri='/akn/za/act/2005/1'),
+                                 document_xml=document_fixture(text='hello'))
+
+    def test_hit(self):
+        self.assertEqual('<div>1</div>', self.html_cache.render(self.document, self.renderer))
+        self.assertEqual('<div>1</div>', self.html_cache.render(self.document, self.renderer))
+        self.assertEqual(1, len(self.renderer.rendered))
+
+    def test_miss_unsaved(self):
+        self.document.pk = None
+        self.html_cache.render(self.document, self.renderer)
+        self.html_cache.render(self.document, self.renderer)
+        self.assertEqual(2, len(self.renderer.rendered))
+
+    def test_xml_changed(self):
+        self.html_cache.render(self.document, self.renderer)
+        self.document.document_xml = document_fixture(text='changed')
+        self.assertEqual('<div>2</div>', self.html_cache.render(self.document, self.renderer))
+
+    def test_params_changed(self):
+        self.html_cache.render(self.document, self.renderer)
+        renderer = FakeRenderer(self.xslt_filename, {'resolverUrl': "'https://example.com'"})
+        self.html_cache.render(self.document, renderer)
+        self.assertEqual(1, len(renderer.rendered))
+
+    def test_stylesheet_changed(self):
+        self.html_cache.render(self.document, self.renderer)
+        mtime = os.stat(self.xslt_filename).st_mtime + 10
+        os.utime(self.xslt_filename, (mtime, mtime))
+        self.html_cache.render(self.document, self.renderer)
+        self.assertEqual(2, len(self.renderer.rendered))
+
+    def toc(self):
+        return [
+            TOCElement('chapter 1', 'main', 'chapter', num='1', subcomponent='chapter/1', children=[
+                TOCElement('section 1', 'main', 'section', num='1', subcomponent='section/1'),
+                # elements without subcomponents can't be requested on their own
+                TOCElement('subsection', 'main', 'subsection', num='(1)', subcomponent=None),
+            ]),
+            # a duplicate subcomponent, which is never served
+            TOCElement('section 1 again', 'main', 'section', num='1', subcomponent='section/1'),
+        ]
+
+    def test_render_elements(self):
+        with patch.object(Document, 'table_of_contents', return_value=self.toc()):
+            self.html_cache.render_elements(self.document, self.renderer)
+
+        self.assertEqual(['chapter 1', 'section 1'], self.renderer.rendered)
+        self.assertEqual('<div>chapter 1</div>',
+                         self.html_cache.get_element_html(self.document, self.renderer, 'main', 'chapter/1'))
+        self.assertEqual('<div>section 1</div>',
+                         self.html_cache.get_element_html(self.document, self.renderer, 'main', 'section/1'))
+        self.assertIsNone(self.html_cache.get_element_html(self.document, self.renderer, 'main', 'section/2'))
+
+        # pre-rendered elements belong to the XML they were rendered from
+        self.document.document_xml = document_fixture(text='changed')
+        self.assertIsNone(self.html_cache.get_element_html(self.document, self.renderer, 'main', 'chapter/1'))
+
+    def test_warm(self):
+        with patch.object(Document, 'table_of_contents', return_value=self.toc()), \
+                patch('indigo_api.exporters.HTMLExporter._xml_renderer', return_value=self.renderer):
+            self.html_cache.warm(self.document)
+
+        self.assertEqual('<div>1</div>', self.html_cache.render(self.document, self.renderer))
+        self.assertEqual('<div>chapter 1</div>',
+                         self.html_cache.get_element_html(self.document, self.renderer, 'main', 'chapter/1'))
+        self.assertEqual(3, len(self.renderer.rendered))
+
+    @patch('indigo_api.models.documents.schedule_prerender_document')
+    @patch('indigo_api.render_cache.RenderedHTMLCache.warm')
+    def test_publishing_never_renders_during_the_request(self, warm, schedule):
+        with override_settings(INDIGO={**settings.INDIGO, 'PRERENDER_DOCUMENTS': False}):
+            document_published.send(sender=self.__class__, document=self.document, request=None)
+        self.assertFalse(warm.called)
+        self.assertFalse(schedule.called)
+
+        with override_settings(INDIGO={**settings.INDIGO, 'PRERENDER_DOCUMENTS': True}):
+            document_published.send(sender=self.__class__, document=self.document, request=None)
+        self.assertFalse(warm.called)
+        schedule.assert_called_once_with(self.document)
+
+
+class DocumentRenditionsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileSystemStorage(location=self.tmpdir.name)
+        patch.object(DocumentRenditions, 'storage', self.storage).start()
+        self.fingerprint = patch.object(DocumentRenditions, 'fingerprint', return_value='one').start()
+        self.exporter = MagicMock()
+        self.exporter.render.side_effect = lambda document: f'{self.fingerprint.return_value}'.encode('utf-8')
+        patch.object(DocumentRenditions, 'get_exporter', return_value=self.exporter).start()
+        self.addCleanup(patch.stopall)
+
+        self.renditions = DocumentRenditions()
+        self.document = Document(pk=1, work=Work(frbr_uri='/akn/za/act/2005/1'), draft=False,
+                                 updated_at=datetime.datetime(2021, 1, 1, 10, 0),
+                                 document_xml=document_fixture(text='hello'))
+
+    def test_get(self):
+        self.assertIsNone(self.renditions.get(self.document, 'pdf'))
+        self.renditions.render(self.document, 'pdf')
+        self.assertEqual(b'one', self.renditions.get(self.document, 'pdf'))
+        self.assertIsNone(self.renditions.get(self.document, 'epub'))
+
+        # drafts are never served
+        self.document.draft = True
+        self.assertIsNone(self.renditions.get(self.document, 'pdf'))
+
+    def test_fingerprint_changed(self):
+        self.renditions.render(self.document, 'pdf')
+        # eg. a commencement of the work changed
+        self.fingerprint.return_value = 'two'
+        self.assertIsNone(self.renditions.get(self.document, 'pdf'))
+
+    def test_render_all(self):
+        self.renditions.render_all(self.document)
+        self.assertEqual(['one-en-us.epub', 'one-en-us.pdf'], sorted(self.storage.listdir('renditions/1')[1]))
+        self.assertEqual(2, self.exporter.render.call_count)
+
+        # current renditions aren't rendered again
+        self.renditions.render_all(self.document)
+        self.assertEqual(2, self.exporter.render.call_count)
+
+        # outdated renditions are discarded
+        self.fingerprint.return_value = 'two'
+        self.renditions.render_all(self.document)
+        self.assertEqual(['two-en-us.epub', 'two-en-us.pdf'], sorted(self.storage.listdir('renditions/1')[1]))
+        self.assertEqual(b'two', self.renditions.get(self.document, 'epub'))
+
+    def test_render_all_continues_after_errors(self):
+        self.exporter.render.side_effect = [ValueError('broken'), b'epub']
+        with self.assertLogs('indigo_api.render_cache', 'ERROR'):
+            self.renditions.render_all(self.document)
+        self.assertIsNone(self.renditions.get(self.document, 'pdf'))
+        self.assertEqual(b'epub', self.renditions.get(self.document, 'epub'))
+
+    def test_language(self):
+        with translation.override('en-us'):
+            self.renditions.render_all(self.document)
+
+        with translation.override('fr'):
+            # the coverpage is translated, so renditions are only served in the language they were rendered in
+            self.assertIsNone(self.renditions.get(self.document, 'pdf'))
+            self.renditions.render_all(self.document)
+            self.assertEqual(b'one', self.renditions.get(self.document, 'pdf'))
+
+        # both are current
+        self.assertEqual(['one-en-us.epub', 'one-en-us.pdf', 'one-fr.epub', 'one-fr.pdf'],
+                         sorted(self.storage.listdir('renditions/1')[1]))
+
+        self.fingerprint.return_value = 'two'
+        with translation.override('en-us'):
+            self.renditions.render_all(self.document)
+        self.assertEqual(['two-en-us.epub', 'two-en-us.pdf'], sorted(self.storage.listdir('renditions/1')[1]))
+
+    def test_clear(self):
+        # nothing to clear
+        self.renditions.clear(self.document)
+
+        self.renditions.render_all(self.document)
+        self.renditions.clear(self.document)
+        self.assertEqual([], self.storage.listdir('renditions/1')[1])
+
+
+class DocumentRenditionsFingerprintTestCase(TestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work', 'published']
+
+    def test_fingerprint_changes_with_work(self):
+        renditions = DocumentRenditions()
+        document = Document.objects.get(pk=1)
+        fingerprint = renditions.fingerprint(document)
+        self.assertEqual(fingerprint, renditions.fingerprint(Document.objects.get(pk=1)))
+
+        # a new commencement doesn't change the document
+        commencement = Commencement.objects.create(commenced_work=document.work, date='2020-01-01')
+        self.assertNotEqual(fingerprint, renditions.fingerprint(document))
+        fingerprint = renditions.fingerprint(document)
+
+        commencement.note = 'changed'
+        commencement.save()
+        self.assertNotEqual(fingerprint, renditions.fingerprint(document))
+        fingerprint = renditions.fingerprint(document)
+
+        document.work.title = 'Changed'
+        document.work.save()
+        self.assertNotEqual(fingerprint, renditions.fingerprint(document))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RenditionRendererTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.document = Document(pk=1, work=Work(frbr_uri='/akn/za/act/2005/1'), draft=False,
+                                 updated_at=datetime.datetime(2021, 1, 1, 10, 0))
+        self.view = MagicMock(component='main', subcomponent=None)
+
+    def render(self, renderer, resolver=None):
+        request = MagicMock(GET={'resolver': resolver} if resolver else {})
+        return renderer.render(self.document, renderer_context={'view': self.view, 'request': request, 'response': {}})
+
+    @patch('indigo_api.render_cache.DocumentRenditions.get', return_value=b'stored')
+    def test_stored_renditions_used(self, get):
+        for renderer_class in [PDFRenderer, EPUBRenderer]:
+            renderer = renderer_class()
+            with patch.object(renderer_class, 'get_filename', return_value='doc'), \
+                    patch.object(renderer_class, 'get_exporter') as get_exporter:
+                self.assertEqual(b'stored', self.render(renderer))
+            self.assertFalse(get_exporter.called)
+            get.assert_called_with(self.document, renderer.format)
+
+    @patch('indigo_api.render_cache.DocumentRenditions.get', return_value=b'stored')
+    def test_stored_renditions_not_used(self, get):
+        renderer = PDFRenderer()
+        with patch.object(PDFRenderer, 'get_filename', return_value='doc'), \
+                patch.object(PDFRenderer, 'get_exporter') as get_exporter:
+            get_exporter.return_value.render.return_value = b'rendered'
+            # a different resolver
+            self.assertEqual(b'rendered', self.render(renderer, resolver='none'))
+
+            # a portion of the document
+            self.view.subcomponent = 'chapter/1'
+            self.assertEqual(b'rendered', self.render(renderer))
+        self.assertFalse(get.called)
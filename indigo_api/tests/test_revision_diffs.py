@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from mock import MagicMock, patch
+from rest_framework.test import APITestCase
+from reversion.models import Version
+
+from indigo.analysis.differ import AttributeDiffer
+from indigo_api.models import Document, User
+from indigo_api.revision_diffs import RevisionDiffCache, revision_diffs
+from indigo_api.tests.fixtures import document_fixture
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RevisionDiffCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.diffs = RevisionDiffCache()
+        self.versions = [MagicMock(pk=pk) for pk in [1, 2, 3]]
+        self.compute = patch.object(
+            RevisionDiffCache, 'compute',
+            side_effect=lambda differ, old, new: {'content': f'{old.pk if old else "-"} to {new.pk}', 'n_changes': 1},
+        ).start()
+        self.addCleanup(patch.stopall)
+
+    def test_diff(self):
+        v1, v2, v3 = self.versions
+        self.assertEqual({'content': '1 to 2', 'n_changes': 1}, self.diffs.diff(v1, v2))
+        self.assertEqual({'content': '1 to 2', 'n_changes': 1}, self.diffs.diff(v1, v2))
+        self.assertEqual(1, self.compute.call_count)
+
+        self.assertEqual({'content': '2 to 3', 'n_changes': 1}, self.diffs.diff(v2, v3))
+        # the first version has nothing to compare against
+        self.assertEqual({'content': '- to 1', 'n_changes': 1}, self.diffs.diff(None, v1))
+        self.assertEqual(3, self.compute.call_count)
+
+    def test_differ_changed(self):
+        v1, v2, _ = self.versions
+        self.diffs.diff(v1, v2)
+        with patch.object(AttributeDiffer, 'version', AttributeDiffer.version + 1):
+            self.diffs.diff(v1, v2)
+        self.assertEqual(2, self.compute.call_count)
+
+    def test_warm(self):
+        v1, v2, _ = self.versions
+        with patch.object(RevisionDiffCache, 'previous_version', return_value=v1):
+            self.diffs.warm(v2)
+        self.diffs.diff(v1, v2)
+        self.assertEqual(1, self.compute.call_count)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RevisionDiffsTestCase(APITestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'editor', 'taxonomies', 'work', 'published']
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='email@example.com', password='password')
+        self.user = User.objects.get(username='email@example.com')
+        self.document = Document.objects.get(id=1)
+        for text in ['hello', 'goodbye']:
+            self.document.content = document_fixture(text=text)
+            self.document.save_with_revision(self.user)
+        self.new_id, self.old_id = self.document.versions().values_list('pk', flat=True)[:2]
+
+    def version(self, pk):
+        # a fresh copy, because computing a diff changes the version's document
+        return Version.objects.get(pk=pk)
+
+    def test_previous_version(self):
+        new = self.version(self.new_id)
+        self.assertEqual(self.old_id, revision_diffs.previous_version(new).pk)
+
+        # the same as the view
+        old_version = self.document.versions().defer('serialized_data').filter(id__lt=new.id).first()
+        self.assertEqual(old_version, revision_diffs.previous_version(new))
+
+        self.assertIsNone(revision_diffs.previous_version(self.version(self.old_id)))
+
+    def test_diff_matches_uncached(self):
+        uncached = revision_diffs.compute(AttributeDiffer(), self.version(self.old_id), self.version(self.new_id))
+        self.assertGreater(uncached['n_changes'], 0)
+
+        self.assertEqual(uncached, revision_diffs.diff(self.version(self.old_id), self.version(self.new_id)))
+        with patch.object(RevisionDiffCache, 'compute') as compute:
+            self.assertEqual(uncached, revision_diffs.diff(self.version(self.old_id), self.version(self.new_id)))
+            response = self.client.get(f'/api/documents/1/revisions/{self.new_id}/diff')
+        self.assertFalse(compute.called)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(uncached, response.data)
+
+    def test_precompute_on_revision(self):
+        with override_settings(INDIGO={**settings.INDIGO, 'PRECOMPUTE_REVISION_DIFFS': True}), \
+                patch('indigo_api.tasks.precompute_revision_diff') as precompute, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.document.content = document_fixture(text='again')
+            self.document.save_with_revision(self.user)
+
+        precompute.assert_called_once_with(self.document.versions().first().pk)
+
+        # the task computes the diff that the view uses
+        revision_diffs.warm(self.version(precompute.call_args[0][0]))
+        with patch.object(RevisionDiffCache, 'compute') as compute:
+            response = self.client.get(f'/api/documents/1/revisions/{precompute.call_args[0][0]}/diff')
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(compute.called)
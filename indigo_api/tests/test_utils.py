@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+from django.template.loader import TemplateDoesNotExist
+from django.utils.autoreload import file_changed
+from mock import patch
+
+from indigo_api.utils import clear_candidate_cache, find_best_static, find_best_template
+
+
+class FindBestCandidateTestCase(SimpleTestCase):
+    def setUp(self):
+        clear_candidate_cache()
+        self.addCleanup(clear_candidate_cache)
+
+        self.find_static = patch('indigo_api.utils.find_static',
+                                 side_effect=lambda f: f'/static/{f}' if f.startswith('act') else None).start()
+        self.get_template = patch('indigo_api.utils.get_template', side_effect=self.template_exists).start()
+        self.addCleanup(patch.stopall)
+
+    def template_exists(self, name):
+        if not name.startswith('act'):
+            raise TemplateDoesNotExist(name)
+        return name
+
+    def test_find_best_static_memoized(self):
+        candidates = ['act-za.css', 'akn.css']
+        self.assertEqual('/static/act-za.css', find_best_static(candidates))
+        self.assertEqual('act-za.css', find_best_static(candidates, actual=False))
+        self.assertEqual(1, self.find_static.call_count)
+
+        self.assertIsNone(find_best_static(['bylaw.css', 'akn.css']))
+        self.assertIsNone(find_best_static(['bylaw.css', 'akn.css']))
+        self.assertEqual(3, self.find_static.call_count)
+
+    def test_find_best_template_memoized(self):
+        candidates = ['bylaw.html', 'act.html']
+        self.assertEqual('act.html', find_best_template(candidates))
+        self.assertEqual('act.html', find_best_template(candidates))
+        self.assertEqual(2, self.get_template.call_count)
+
+    def test_cleared_when_files_change(self):
+        find_best_template(['act.html'])
+        file_changed.send(sender=None, file_path=Path('/tmp/act.html'))
+        find_best_template(['act.html'])
+        self.assertEqual(2, self.get_template.call_count)
+
+    def test_cleared_when_settings_change(self):
+        find_best_static(['act.css'])
+        with override_settings(STATICFILES_DIRS=[]):
+            find_best_static(['act.css'])
+        self.assertEqual(2, self.find_static.call_count)
@@ -4,7 +4,10 @@ from django.template.loader import get_template, TemplateDoesNotExist
 from functools import lru_cache
 from django.contrib.postgres.search import Value, Func, SearchRank
 from django.contrib.staticfiles.finders import find as find_static
+from django.core.signals import setting_changed
 from django.db.models import TextField
+from django.dispatch import receiver
+from django.utils.autoreload import file_changed
 
 from languages_plus.models import Language
 from rest_framework.pagination import PageNumberPagination as BasePageNumberPagination
@@ -99,18 +102,35 @@ def filename_candidates(document, prefix='', suffix=''):
 
 def find_best_static(candidates, actual=True):
     """ Return the first static file that exists given a list of candidate files.
+
+    Results are memoized, so repeated lookups for the same candidates don't touch the filesystem.
     """
+    fname, option = _find_best_static(tuple(candidates))
+    return fname if actual else option
+
+
+# candidates can come from URLs, so the number of memoized results is bounded
+@lru_cache(maxsize=1024)
+def _find_best_static(candidates):
     for option in candidates:
         log.debug("Looking for %s" % option)
         fname = find_static(option)
         if fname:
             log.debug("Using %s" % fname)
-            return fname if actual else option
+            return fname, option
+    return None, None
 
 
 def find_best_template(candidates):
     """ Return the first template that exists given a list of candidate files.
+
+    Results are memoized, so repeated lookups for the same candidates don't touch the filesystem.
     """
+    return _find_best_template(tuple(candidates))
+
+
+@lru_cache(maxsize=1024)
+def _find_best_template(candidates):
     for option in candidates:
         try:
             log.debug("Looking for %s" % option)
@@ -119,3 +139,21 @@ def find_best_template(candidates):
                 return option
         except TemplateDoesNotExist:
             pass
+    return None
+
+
+def clear_candidate_cache():
+    _find_best_static.cache_clear()
+    _find_best_template.cache_clear()
+
+
+@receiver(file_changed)
+def candidate_cache_file_changed(sender, file_path, **kwargs):
+    # templates and static files can be added or removed while the dev server is running
+    clear_candidate_cache()
+
+
+@receiver(setting_changed)
+def candidate_cache_setting_changed(sender, setting, **kwargs):
+    if setting in ['INSTALLED_APPS', 'TEMPLATES', 'STATICFILES_DIRS', 'STATICFILES_FINDERS']:
+        clear_candidate_cache()
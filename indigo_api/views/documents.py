@@ -7,7 +7,7 @@ from django.views import View
 from django.views.decorators.cache import cache_control
 from django.contrib.contenttypes.models import ContentType
 from django.templatetags.static import static
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.urls import reverse
 from django.utils import timezone
 from django_comments.models import Comment
@@ -26,11 +26,13 @@ import lxml.html.diff
 from lxml.etree import LxmlError
 
 from indigo.analysis.differ import AttributeDiffer
+from indigo.analysis.runner import AnalysisRunner, find_changed_eids
 from indigo.plugins import plugins
 from ..models import Document, Annotation, DocumentActivity, Task
-from ..serializers import DocumentSerializer, RenderSerializer, ParseSerializer, DocumentAPISerializer, VersionSerializer, AnnotationSerializer, DocumentActivitySerializer, TaskSerializer, DocumentDiffSerializer
+from ..serializers import DocumentSerializer, RenderSerializer, ParseSerializer, DocumentAnalysisSerializer, VersionSerializer, AnnotationSerializer, DocumentActivitySerializer, TaskSerializer, DocumentDiffSerializer
 from ..renderers import AkomaNtosoRenderer, PDFRenderer, EPUBRenderer, HTMLRenderer, ZIPRenderer
 from indigo_api.exporters import HTMLExporter
+from indigo_api.revision_diffs import revision_diffs
 from ..authz import DocumentPermissions, AnnotationPermissions, ModelPermissions, RelatedDocumentPermissions, \
     RevisionPermissions
 from ..utils import filename_candidates, find_best_static
@@ -68,7 +70,7 @@ class DocumentViewMixin:
             self.serializer_class = self.request.accepted_renderer.serializer_class
 
     def table_of_contents(self, document, uri=None):
-        return [t.as_dict() for t in document.table_of_contents()]
+        return document.table_of_contents_json()
 
 
 # Read/write REST API
@@ -130,7 +132,14 @@ class DocumentViewSet(DocumentViewMixin,
         """ This exposes a GET resource at ``/api/documents/1/toc`` which gives
         a table of contents for the document.
         """
-        return Response({'toc': self.table_of_contents(self.get_object())})
+        document = self.get_object()
+        if isinstance(request.accepted_renderer, renderers.JSONRenderer) \
+                and type(self).table_of_contents is DocumentViewMixin.table_of_contents:
+            # TOCs can be large, so encode them directly rather than through the renderer, unless
+            # a subclass changes them
+            return HttpResponse('{"toc":' + document.table_of_contents_json_text() + '}',
+                                content_type=request.accepted_renderer.media_type)
+        return Response({'toc': self.table_of_contents(document)})
 
 
 class DocumentResourceView:
@@ -246,32 +255,8 @@ class RevisionViewSet(DocumentResourceView, viewsets.ReadOnlyModelViewSet):
         # most recent version just before this one
         old_version = self.get_queryset().filter(id__lt=version.id).first()
 
-        differ = AttributeDiffer()
-
-        if old_version:
-            old_document = old_version._object_version.object
-            old_document.document_xml = differ.preprocess_document_diff(old_document.document_xml)
-            old_html = old_document.to_html()
-        else:
-            old_html = ""
-
-        new_document = version._object_version.object
-        new_document.document_xml = differ.preprocess_document_diff(new_document.document_xml)
-        new_html = new_document.to_html()
-
-        old_tree = lxml.html.fromstring(old_html) if old_html else None
-        new_tree = lxml.html.fromstring(new_html)
-        n_changes, diff = differ.diff_document_html(old_tree, new_tree)
-
-        if not isinstance(diff, str):
-            diff = lxml.html.tostring(diff, encoding='unicode')
-
         # TODO: include other diff'd attributes
-
-        return Response({
-            'content': diff,
-            'n_changes': n_changes,
-        })
+        return Response(revision_diffs.diff(old_version, version))
 
     def get_queryset(self):
         return self.document.versions().defer('serialized_data')
@@ -370,78 +355,53 @@ class RenderView(DocumentResourceView, APIView):
             return Response({'output': document.to_html()})
 
 
-class LinkTermsView(DocumentResourceView, APIView):
-    """ Support for running term discovery and linking on a document.
-    """
-    def post(self, request, document_id):
-        serializer = DocumentAPISerializer(instance=self.document, data=self.request.data)
-        serializer.fields['document'].fields['content'].required = True
-        serializer.is_valid(raise_exception=True)
-        document = serializer.fields['document'].update_document(self.document, serializer.validated_data['document'])
-
-        self.link_terms(document)
+class DocumentAnalysisView(DocumentResourceView, APIView):
+    """ Base class for views that run analysis on a document and return the updated document.
 
-        return Response({'document': {'content': document.document_xml}})
-
-    def link_terms(self, doc):
-        finder = plugins.for_document('terms', doc)
-        if finder:
-            finder.find_terms_in_document(doc)
-
-
-class LinkReferencesView(DocumentResourceView, APIView):
-    """ Find and link internal references and references to other works.
+    By default, the whole document is analysed. If `changed_eids` is given, or `incremental` is true (in which
+    case the changed elements are found by comparing the document with the saved version), only the changed
+    elements are analysed. This assumes that the rest of the document has already been analysed.
     """
     def post(self, request, document_id):
-        serializer = DocumentAPISerializer(instance=self.document, data=self.request.data)
+        serializer = DocumentAnalysisSerializer(instance=self.document, data=self.request.data)
         serializer.fields['document'].fields['content'].required = True
         serializer.is_valid(raise_exception=True)
+
+        eids = serializer.validated_data.get('changed_eids')
+        previous_xml = self.document.document_xml
         document = serializer.fields['document'].update_document(self.document, serializer.validated_data['document'])
+        if eids is None and serializer.validated_data.get('incremental'):
+            eids = find_changed_eids(previous_xml, document.document_xml)
 
-        self.find_references(document)
+        runner = AnalysisRunner(document, eids)
+        self.analyse(runner)
+        runner.finish()
 
         return Response({'document': {'content': document.document_xml}})
 
-    def find_references(self, document):
-        finder = plugins.for_document('refs', document)
-        if finder:
-            finder.find_references_in_document(document)
+    def analyse(self, runner):
+        raise NotImplementedError()
 
-        finder = plugins.for_document('refs-subtypes', document)
-        if finder:
-            finder.find_references_in_document(document)
 
-        finder = plugins.for_document('refs-cap', document)
-        if finder:
-            finder.find_references_in_document(document)
+class LinkTermsView(DocumentAnalysisView):
+    """ Support for running term discovery and linking on a document.
+    """
+    def analyse(self, runner):
+        runner.link_terms()
 
-        finder = plugins.for_document('refs-act-names', document)
-        if finder:
-            finder.find_references_in_document(document)
 
-        finder = plugins.for_document('internal-refs', document)
-        if finder:
-            finder.find_references_in_document(document)
+class LinkReferencesView(DocumentAnalysisView):
+    """ Find and link internal references and references to other works.
+    """
+    def analyse(self, runner):
+        runner.find_references()
 
 
-class MarkUpItalicsTermsView(DocumentResourceView, APIView):
+class MarkUpItalicsTermsView(DocumentAnalysisView):
     """ Find and mark up italics terms.
     """
-    def post(self, request, document_id):
-        serializer = DocumentAPISerializer(instance=self.document, data=self.request.data)
-        serializer.fields['document'].fields['content'].required = True
-        serializer.is_valid(raise_exception=True)
-        document = serializer.fields['document'].update_document(self.document, serializer.validated_data['document'])
-
-        self.mark_up_italics(document)
-
-        return Response({'document': {'content': document.document_xml}})
-
-    def mark_up_italics(self, document):
-        italics_terms_finder = plugins.for_document('italics-terms', document)
-        italics_terms = document.work.country.italics_terms
-        if italics_terms_finder and italics_terms:
-            italics_terms_finder.mark_up_italics_in_document(document, italics_terms)
+    def analyse(self, runner):
+        runner.mark_up_italics()
 
 
 class DocumentDiffView(DocumentResourceView, APIView):
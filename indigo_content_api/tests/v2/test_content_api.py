@@ -1,5 +1,7 @@
+import io
 import json
 import tempfile
+import zipfile
 from datetime import date
 
 from mock import patch
@@ -546,7 +548,12 @@ class ContentAPIV2TestMixin:
     def test_published_zipfile_many(self):
         response = self.client.get(self.api_path + '/akn/za/act/2001.zip')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.accepted_media_type, 'application/zip')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(response.streaming)
+
+        zf = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(zf.testzip())
+        self.assertIn('2001-8/main.xml', zf.namelist())
 
     def test_published_frbr_urls(self):
         response = self.client.get(self.api_path + '/akn/za/act/2014/10/eng@2014-02-12.json')
@@ -174,6 +174,13 @@ class PublishedDocumentDetailView(DocumentViewMixin,
         document = self.get_document()
 
         if self.subcomponent:
+            if hasattr(self.request.accepted_renderer, 'cached_element_html'):
+                # use the pre-rendered HTML if possible, which avoids parsing the document
+                self.element_html = self.request.accepted_renderer.cached_element_html(
+                    request, document, self.component, self.subcomponent)
+                if self.element_html is not None:
+                    return Response(document)
+
             self.element = document.get_subcomponent(self.component, self.subcomponent)
         else:
             # special cases of the entire document
@@ -199,7 +206,16 @@ class PublishedDocumentDetailView(DocumentViewMixin,
     def list(self, request):
         """ Return details on many documents.
         """
-        if self.request.accepted_renderer.format in ['pdf', 'epub', 'zip']:
+        if self.request.accepted_renderer.format == 'zip':
+            # stream the documents into the zipfile one at a time, sorted by title
+            queryset = self.filter_queryset(self.get_queryset())
+            documents = Document.objects\
+                .filter(pk__in=queryset.values('pk'))\
+                .select_related('work')\
+                .order_by('title')
+            return self.request.accepted_renderer.streaming_response(documents.iterator(), self)
+
+        if self.request.accepted_renderer.format in ['pdf', 'epub']:
             # NB: don't try to sort in the db, that's already sorting to
             # return the latest expression of each doc. Sort here instead.
             documents = sorted(self.filter_queryset(self.get_queryset()).all(), key=lambda d: d.title)
@@ -288,7 +304,7 @@ class PublishedDocumentTOCView(DocumentViewMixin, FrbrUriViewMixin, mixins.Retri
 
     def get(self, request, **kwargs):
         document = self.get_document()
-        uri = document.doc.frbr_uri
+        uri = document.expression_uri.clone()
         uri.expression_date = self.frbr_uri.expression_date
         return Response({'toc': self.table_of_contents(document, uri)})
 
@@ -297,7 +313,7 @@ class PublishedDocumentTOCView(DocumentViewMixin, FrbrUriViewMixin, mixins.Retri
 
         # this updates the TOC entries by adding a 'url' component
         # based on the document's URI and the path of the TOC subcomponent
-        uri = uri or document.doc.frbr_uri
+        uri = uri or document.expression_uri.clone()
 
         def add_url(item):
             uri.expression_component = item['component']